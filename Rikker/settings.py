@@ -25,6 +25,9 @@ DATABASES = {
     }
 }
 
+# SQLite writes one transaction at a time, so with sqlite3 the actions on different games
+# take turns instead of running concurrently (see game.changes.database_turn).
+
 # Hosts/domain names that are valid for this site; required if DEBUG is False
 # See https://docs.djangoproject.com/en/1.5/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = []
@@ -142,6 +145,30 @@ LOGIN_URL = '/login/'
 # The URL where requests are redirected after login when the contrib.auth.login view gets no next parameter.
 LOGIN_REDIRECT_URL = '/'
 
+# The maximum amount of seconds a game page waits for an update before asking again
+GAME_UPDATE_TIMEOUT = 25
+
+# The Unix socket the push gateway (pushgateway.py) listens on for game changes and
+# the URL the browsers reach it at, "{}" is replaced by the game id. Leave these
+# empty to let the game pages long-poll the Django views instead.
+GAME_PUSH_SOCKET = None
+GAME_PUSH_URL = None
+
+# The amount of threads taking the turns of the bots. With BOT_SYNCHRONOUS the bots
+# take their turns right away, during the request of the player before them.
+BOT_WORKERS = 4
+BOT_SYNCHRONOUS = False
+
+# The strategy the bots play with (see bot.strategies) and the strategies of single
+# bots by username. The Monte Carlo bots think at most BOT_MOVE_SECONDS per move.
+BOT_STRATEGY = 'montecarlo'
+BOT_STRATEGIES = {}
+BOT_MOVE_SECONDS = 0.2
+
+# The time budgets of the view tests (see game/tests.py) are multiplied by this. Raise
+# it on slow machines, or set it to 0 to only check the query budgets.
+VIEW_BUDGET_TIME_SCALE = float(os.environ.get('VIEW_BUDGET_TIME_SCALE', 1))
+
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
 # the site admins on every HTTP 500 error when DEBUG=False.
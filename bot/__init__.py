@@ -1,39 +1,145 @@
+from django.conf import settings
+
 from portal import bidding_needed, playing_needed, collection_needed
-from game.models import Bid, Round, Card, Trick
-
-def do_bidding(sender, **kwargs):
-    next_player_to_bid = sender.next_player_to_bid()
-    if next_player_to_bid is not None and next_player_to_bid.is_bot:
-        try:
-            sender.place_bid(next_player_to_bid, Bid.PASS)
-        except Round.BadBidException:
-            # This can only be if this bot is the last player and everybody else has passed.
-            sender.place_bid(next_player_to_bid, Bid.RIK)
-            
-    if sender.highest_bid is not None and sender.highest_bid.player.is_bot and not sender.highest_bid.is_complete():
-        for suit in Card.SUITS:
-            try:
-                sender.finalize_bid(sender.highest_bid.player, trump_suit=Card.CLUBS, mate_suit=suit[0])
-                break
-            except Bid.IllegalChoiceException:
-                pass
-bidding_needed.connect(do_bidding)
-
-def do_play_card(sender, **kwargs):
-    next_player_to_play = sender.next_player_to_play()
-    if next_player_to_play.is_bot:
-        owned_cards = list(sender.round.game.isplaying_set.get(player=next_player_to_play).cards.all())
-        card_to_play = 0
-        while True:
-            try:
-                sender.play_card(next_player_to_play, owned_cards[card_to_play])
-                break
-            except Trick.BadPlayException:
-                card_to_play += 1
-            
-playing_needed.connect(do_play_card)
-
-def do_collect_trick(sender, **kwargs):
-    if sender.winner().is_bot:
-        sender.collect(sender.winner())
-collection_needed.connect(do_collect_trick)
\ No newline at end of file
+from game import engine, cardset
+from game.models import Round, Card, Trick, Game
+from game.changes import game_changes, unit_of_work
+from bot.scheduler import BotScheduler
+from bot.strategy import Strategy
+from bot.montecarlo import MonteCarloStrategy
+
+# The strategies the bots can play with, by name
+strategies = {
+    'simple': Strategy(),
+    'montecarlo': MonteCarloStrategy(settings.BOT_MOVE_SECONDS),
+}
+
+def register_strategy(name, strategy):
+    strategies[name] = strategy
+
+def strategy_for(player):
+    """
+    Returns the strategy the given bot plays with: the one named for it in
+    settings.BOT_STRATEGIES, or else settings.BOT_STRATEGY
+
+    """
+    return strategies[settings.BOT_STRATEGIES.get(player.username, settings.BOT_STRATEGY)]
+
+# The actions a bot takes
+BID, FINALIZE, PLAY, COLLECT = 'bid', 'finalize', 'play', 'collect'
+
+def waiting_bot(game):
+    """
+    Returns the action the given game waits for and the bot that has to take
+    it, or None when the game is not waiting for a bot
+
+    """
+    if game.current_state() is not Game.DURING_ROUND:
+        return None
+
+    round = game.current_round
+    phase = round.current_phase()
+    if phase is Round.BIDDING_PHASE:
+        action, player = BID, round.next_player_to_bid()
+    elif phase is Round.FINALIZE_BIDDING_PHASE and not round.highest_bid.is_complete():
+        action, player = FINALIZE, round.highest_bid.player
+    elif phase is Round.TRICK_TAKING_PHASE:
+        trick = round.current_trick()
+        if trick.current_phase() is Trick.PLAY_PHASE:
+            action, player = PLAY, trick.next_player_to_play()
+        elif not trick.collected:
+            action, player = COLLECT, trick.winner()
+        else:
+            return None
+    else:
+        return None
+
+    if player is None or not player.is_bot:
+        return None
+    return action, player
+
+def choose_move(game, action, player):
+    """
+    Returns the bid, the (trump suit, mate suit) or the card the given bot
+    picks for the given action. The strategy thinks on a copy of the round,
+    so the game itself is left alone.
+
+    """
+    round_state = game.current_round.state().copy()
+    seat = game.seat_of(player.id)
+    strategy = strategy_for(player)
+    if action is BID:
+        return strategy.choose_bid(round_state, seat)
+    elif action is FINALIZE:
+        return strategy.choose_finalization(round_state, seat)
+    elif action is PLAY:
+        return strategy.choose_card(round_state, seat)
+    return None
+
+def is_legal(game, action, player, move):
+    round_state = game.current_round.state()
+    seat = game.seat_of(player.id)
+    if action is BID:
+        return move in engine.legal_bids(round_state, seat)
+    elif action is FINALIZE:
+        return tuple(move) in [finalization[:2] for finalization in engine.legal_finalizations(round_state, seat)]
+    elif action is PLAY:
+        return cardset.contains(engine.legal_plays(round_state, seat), move)
+    return True
+
+def make_move(game, action, player, move):
+    round = game.current_round
+    if action is BID:
+        round.place_bid(player, move)
+    elif action is FINALIZE:
+        trump_suit, mate_suit = move
+        round.finalize_bid(player, trump_suit=trump_suit, mate_suit=mate_suit)
+    elif action is PLAY:
+        round.current_trick().play_card(player, Card.objects.get_by_index(move))
+    elif action is COLLECT:
+        round.current_trick().collect(player)
+
+def take_turn(game_id):
+    """
+    Let the bot whose turn it is in the given game take a single action.
+
+    The bot picks its move before the game is locked, so thinking does not
+    hold up the players of the game or the database. Every action raises the
+    version of the game, so within the unit of work an unchanged version
+    tells the move was picked for the game as it is. When another action came
+    first the turn is scheduled once more and the bot thinks again.
+
+    """
+    game = Game.objects.infofetch(game_id)
+    turn = waiting_bot(game)
+    if turn is None:
+        return
+    action, player = turn
+    move = choose_move(game, action, player)
+
+    with unit_of_work(game_id):
+        if not Game.objects.filter(id=game_id, version=game.version).exists():
+            schedule(game_id)
+            return
+        if not is_legal(game, action, player, move):
+            raise engine.GameException('Bot {} picked {} {}, which is not allowed'.format(player, action, move))
+        make_move(game, action, player, move)
+
+scheduler = BotScheduler(take_turn, workers=settings.BOT_WORKERS)
+
+def schedule(game_id):
+    """
+    Schedule a bot turn in the given game once the action that needs it is
+    committed
+
+    """
+    game_changes.after(lambda: scheduler.schedule(game_id))
+
+def schedule_round(sender, **kwargs):
+    schedule(sender.game_id)
+bidding_needed.connect(schedule_round)
+
+def schedule_trick(sender, **kwargs):
+    schedule(sender.round.game_id)
+playing_needed.connect(schedule_trick)
+collection_needed.connect(schedule_trick)
\ No newline at end of file
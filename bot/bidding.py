@@ -0,0 +1,247 @@
+"""
+Judging a hand for the bidding, for many sampled deals at once.
+
+The bidding bot cannot play a round out for every bid it considers, so it
+estimates the tricks a hand takes instead. The cards it cannot see are dealt
+over the other seats many times with NumPy, and on every sampled deal the
+tricks follow from the suit holdings of the players through lookup tables:
+
+* A side suit is sure to take as many tricks as it has top cards (the ace,
+  the ace and king and so on), but only as long as every opponent holding
+  trumps can still follow suit.
+* The trump suit is sure to take its top cards, or the trumps that are left
+  once the longest trump suit of the opponents is exhausted.
+* A miserie loses a trick in a suit when a card can not be ducked under the
+  cards of the other players, or when the hand holds more cards of the suit
+  than the other players can follow with.
+
+A rik is played by the bidder and whoever holds the mate card together. The
+sure tricks of their combined cards are weighed against the sure tricks of
+the two opponents, and the tricks neither side is sure of are split evenly.
+A vooralles needs every trick to be a sure trick. The expected points of every bid and trump suit over all sampled deals is
+what the bot bids on. evaluate_hands judges any amount of hands in one go,
+for tuning the estimates offline.
+
+"""
+import numpy
+
+from game import engine, cardset
+
+SUIT_SIZE = cardset.SUIT_SIZE
+HOLDINGS = 1 << SUIT_SIZE
+
+# The amount of deals sampled for every hand, and the amount of hands judged at once
+SAMPLES = 200
+CHUNK_SIZE = 250
+
+# Seat 0 holds the hand that is judged, the mate sits at one of the other seats
+MATE_SEATS = tuple(range(1, engine.PLAYERS))
+OPPONENTS = dict((mate, [seat for seat in MATE_SEATS if seat != mate]) for mate in MATE_SEATS)
+
+OPEN_MISERIE_BIDS = (engine.OPENMISERIEKAART, engine.OPENMISERIE)
+
+
+def suit_tables():
+    """
+    Returns the lookup tables for every holding of a single suit, a 13 bit
+    number with a bit for every rank: the number of cards, the number of top
+    cards and the number of cards that can not be ducked under the other
+    cards of the suit
+
+    """
+    length = numpy.zeros(HOLDINGS, dtype=numpy.int8)
+    top = numpy.zeros(HOLDINGS, dtype=numpy.int8)
+    undercut = numpy.zeros(HOLDINGS, dtype=numpy.int8)
+    for holding in range(HOLDINGS):
+        held = [rank for rank in range(SUIT_SIZE) if holding >> rank & 1]
+        others = [rank for rank in range(SUIT_SIZE - 1, -1, -1) if not holding >> rank & 1]
+        length[holding] = len(held)
+        rank = SUIT_SIZE - 1
+        while rank >= 0 and holding >> rank & 1:
+            top[holding] += 1
+            rank -= 1
+        # The lowest held card is played under the highest other card, the next one under the next and so on
+        undercut[holding] = sum(1 for mine, other in zip(held, others) if mine > other)
+    return length, top, undercut
+
+LENGTH, TOP, UNDERCUT = suit_tables()
+
+
+def holdings(hands):
+    """
+    Returns the holding of every suit in the given array of card sets, with
+    an extra last axis for the suits
+
+    """
+    hands = numpy.asarray(hands, dtype=numpy.int64)
+    return numpy.stack([hands >> (suit * SUIT_SIZE) & (HOLDINGS - 1) for suit in engine.SUITS], axis=-1)
+
+def deal_others(hands, samples, rng):
+    """
+    Deals the cards that are not in the given hands over the three other
+    seats, the given amount of times for every hand. Returns the dealt cards
+    as an array of (hands, samples, 3 seats, 13 cards).
+
+    """
+    count = len(hands)
+    cards = numpy.arange(engine.DECK_SIZE, dtype=numpy.int64)
+    held = numpy.asarray(hands, dtype=numpy.int64)[:, None] >> cards & 1
+    # A stable sort puts the unseen cards first, in order
+    unseen = numpy.argsort(held, axis=1, kind='mergesort')[:, :engine.DECK_SIZE - SUIT_SIZE]
+    order = numpy.argsort(rng.random_sample((count, samples, engine.DECK_SIZE - SUIT_SIZE)), axis=2)
+    dealt = numpy.take_along_axis(numpy.broadcast_to(unseen[:, None, :], order.shape), order, axis=2)
+    return dealt.reshape(count, samples, engine.PLAYERS - 1, SUIT_SIZE)
+
+def dealt_holdings(dealt):
+    """
+    Returns the holding of every suit in the given dealt cards, summing over
+    the last axis
+
+    """
+    ranks = numpy.left_shift(1, dealt % SUIT_SIZE)
+    suits = dealt // SUIT_SIZE
+    return numpy.stack([numpy.where(suits == suit, ranks, 0).sum(axis=-1) for suit in engine.SUITS], axis=-1)
+
+def sure_tricks(side_holdings, side_lengths, opponent_lengths, trump_suit):
+    """
+    Returns the tricks a side of one or two players is sure to take with the
+    given trump suit, from the combined holdings of the side in an array of
+    (..., suits), the longest holding of a single player of the side and the
+    lengths of the opponents in an array of (..., opponents, suits)
+
+    """
+    top = TOP[side_holdings]
+    # The opponents can ruff a side suit as soon as they are out of it, if they have trumps
+    can_ruff = opponent_lengths[..., trump_suit] > 0
+    guard = numpy.where(can_ruff[..., None], opponent_lengths, SUIT_SIZE).min(axis=-2)
+    side = numpy.minimum(top, guard)
+    trumps = numpy.maximum(top[..., trump_suit], side_lengths[..., trump_suit] - opponent_lengths[..., trump_suit].max(axis=-1))
+    return numpy.minimum(side.sum(axis=-1) - side[..., trump_suit] + trumps, engine.TRICKS_PER_ROUND)
+
+def team_tricks(suit_holdings, lengths, mate, trump_suit):
+    """
+    Returns the tricks seat 0 and the given mate are expected to take
+    together with the given trump suit, from the holdings and lengths of
+    every seat in an array of (..., seats, suits)
+
+    """
+    team, opponents = [0, mate], OPPONENTS[mate]
+    ours = sure_tricks(numpy.bitwise_or.reduce(suit_holdings[..., team, :], axis=-2), lengths[..., team, :].max(axis=-2),
+                       lengths[..., opponents, :], trump_suit)
+    theirs = sure_tricks(numpy.bitwise_or.reduce(suit_holdings[..., opponents, :], axis=-2), lengths[..., opponents, :].max(axis=-2),
+                         lengths[..., team, :], trump_suit)
+    return (ours + engine.TRICKS_PER_ROUND - theirs) / 2.0
+
+def miserie_losers(suit_holdings, lengths, strict):
+    """
+    Returns the tricks the hand at seat 0 might be forced to take in a
+    miserie. The players of an open miserie can see the cards and strand the
+    hand in the suit that the shortest of them runs out of first.
+
+    """
+    other_lengths = lengths[..., 1:, :]
+    followers = other_lengths.min(axis=-2) if strict else other_lengths.max(axis=-2)
+    stranded = numpy.maximum(lengths[..., 0, :] - followers, 0)
+    return numpy.maximum(UNDERCUT[suit_holdings[..., 0, :]], stranded).sum(axis=-1)
+
+def mate_cards(hand):
+    """
+    Returns the mate card a hand would call with every trump suit, the first
+    mate suit that is allowed, -1 when the hand holds every mate card
+
+    """
+    cards = []
+    for trump_suit in engine.SUITS:
+        mate_card = -1
+        for mate_suit in engine.SUITS:
+            if mate_suit == trump_suit:
+                continue
+            try:
+                mate_card = engine.pick_mate_card(hand, trump_suit, mate_suit)
+                break
+            except (engine.IllegalChoiceException, engine.GameException):
+                pass
+        cards.append(mate_card)
+    return cards
+
+def bid_points(tricks, bid):
+    """
+    Returns the points the bidder earns with the given tricks for the given
+    bid, see engine.asking_team_points
+
+    """
+    if engine.is_rik(bid):
+        needed = engine.tricks_needed_to_win(bid)
+        return numpy.where(tricks >= needed, tricks - needed + 1, tricks - needed - 1)
+    points = engine.points_to_earn(bid)
+    if engine.is_miserie(bid):
+        return numpy.where(tricks == 0, points, -points)
+    return numpy.where(tricks >= engine.TRICKS_PER_ROUND, points, -points)
+
+def evaluate_hands(hands, samples=SAMPLES, rng=None):
+    """
+    Returns the points the given hands (card sets of 13 cards) are expected
+    to earn with every bid and trump suit, as an array of (hands, bids,
+    suits) indexed by the bid and the trump suit. Passing is worth 0 and the
+    miseries, which have no trump, are worth the same with every suit.
+
+    """
+    if rng is None:
+        rng = numpy.random.RandomState()
+    hands = list(hands)
+    return numpy.concatenate([evaluate_chunk(hands[start:start + CHUNK_SIZE], samples, rng)
+                              for start in range(0, len(hands), CHUNK_SIZE)])
+
+def evaluate_chunk(hands, samples, rng):
+    """
+    Returns the expected points of the given list of hands, see
+    evaluate_hands
+
+    """
+    dealt = deal_others(hands, samples, rng)
+
+    # The holdings and lengths of every seat, seat 0 holding the judged hand
+    own = numpy.broadcast_to(holdings(hands)[:, None, None, :], (len(hands), samples, 1, len(engine.SUITS)))
+    suit_holdings = numpy.concatenate([own, dealt_holdings(dealt)], axis=2)
+    lengths = LENGTH[suit_holdings].astype(numpy.int16)
+
+    mate_card_table = numpy.array([mate_cards(hand) for hand in hands])
+    points = numpy.zeros((len(hands), len(engine.BIDS), len(engine.SUITS)))
+    for trump_suit in engine.SUITS:
+        # The mate sits at the seat that was dealt the mate card. A hand without a mate card to call
+        # can't bid a rik with this trump suit, the first seat stands in for the mate then.
+        holds_mate = (dealt == mate_card_table[:, None, None, None, trump_suit]).any(axis=-1)
+        mate = holds_mate.argmax(axis=-1)
+        tricks = numpy.choose(mate, [team_tricks(suit_holdings, lengths, seat, trump_suit) for seat in MATE_SEATS])
+        for bid in engine.RIK_BIDS:
+            points[:, bid, trump_suit] = bid_points(tricks, bid).mean(axis=1)
+
+        tricks = sure_tricks(suit_holdings[..., 0, :], lengths[..., 0, :], lengths[..., 1:, :], trump_suit)
+        for bid in engine.VOORALLES_BIDS:
+            points[:, bid, trump_suit] = bid_points(tricks, bid).mean(axis=1)
+
+    for bid in engine.MISERIE_BIDS:
+        losers = miserie_losers(suit_holdings, lengths, bid in OPEN_MISERIE_BIDS)
+        points[:, bid, :] = bid_points(losers, bid).mean(axis=1)[:, None]
+    return points
+
+def evaluate_hand(hand, samples=SAMPLES, rng=None):
+    """
+    Returns the expected points of a single hand, as an array of (bids,
+    suits), see evaluate_hands
+
+    """
+    return evaluate_hands([hand], samples, rng)[0]
+
+def choose_bid(round_state, seat, samples=SAMPLES, rng=None):
+    """
+    Returns the legal bid the given seat expects to earn the most points
+    with, passing when no bid is expected to earn anything
+
+    """
+    bids = engine.legal_bids(round_state, seat)
+    if not bids:
+        return None
+    points = evaluate_hand(round_state.hands[seat], samples, rng).max(axis=1)
+    # Passing is worth 0, and on a tie the lower bid wins
+    return max(bids, key=lambda bid: (points[bid], -bid))
@@ -0,0 +1,57 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from game import engine
+from bot import strategies
+from bot.montecarlo import MonteCarloStrategy
+from bot.tournament import tournament
+
+
+class Command(BaseCommand):
+    help = 'Let bot strategies play seeded games against each other on a pool of processes and compare them'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--lineup', default='montecarlo,simple',
+                    help='The strategies at the table, separated by commas and repeated until every seat is taken'),
+        make_option('--games', type='int', default=1000, help='The amount of games to play'),
+        make_option('--rounds', type='int', default=4, help='The amount of rounds in every game'),
+        make_option('--seed', type='int', default=None, help='Seed for the decks and the random choices of the bots'),
+        make_option('--workers', type='int', default=None, help='The amount of worker processes, one for every CPU by default'),
+        make_option('--samples', type='int', default=50, help='The most deals the Monte Carlo bots sample for a move'),
+        make_option('--move-seconds', type='float', default=None,
+                    help='The time budget of a move of the Monte Carlo bots, none by default so a seed repeats the tournament'),
+    )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['lineup'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in strategies]
+        if not names or unknown:
+            raise CommandError('Unknown strategy %s, choose from %s' % (', '.join(unknown), ', '.join(sorted(strategies))))
+        lineup = (names * engine.PLAYERS)[:engine.PLAYERS]
+
+        players = dict((name, strategies[name]) for name in lineup)
+        if 'montecarlo' in players:
+            players['montecarlo'] = MonteCarloStrategy(options['move_seconds'], max_samples=options['samples'])
+
+        # The worker processes must not share the database connection of this one
+        connection.close()
+        result = tournament(lineup, players, options['games'], rounds=options['rounds'], seed=options['seed'],
+                            workers=options['workers'])
+
+        self.stdout.write('Played %d games, %d rounds and %d tricks in %.2f seconds, %.1f games/s' % (
+            result.games, result.rounds, result.tricks, result.seconds, result.games_per_second()))
+        self.stdout.write('Lineup: %s' % ', '.join(lineup))
+        self.stdout.write('%-12s %8s %24s %26s %24s' % ('strategy', 'games', 'win rate (95% CI)', 'mean score (95% CI)',
+                                                        'p5 / p50 / p95 score'))
+        for name in sorted(result.strategies):
+            strategy = result.strategies[name]
+            self.stdout.write('%-12s %8d %6.1f%% (%5.1f%% - %5.1f%%) %7.2f (%6.2f - %6.2f) %6.1f / %6.1f / %6.1f' % (
+                name, strategy.games, 100 * strategy.win_rate(),
+                100 * strategy.win_rate_interval()[0], 100 * strategy.win_rate_interval()[1],
+                strategy.mean_score(), strategy.score_interval()[0], strategy.score_interval()[1],
+                strategy.percentile(0.05), strategy.percentile(0.5), strategy.percentile(0.95)))
+        self.stdout.write('%d rule violations' % sum(result.violations.values()))
+        for violation, count in result.violations.most_common():
+            self.stdout.write('  %6d  %s' % (count, violation))
@@ -0,0 +1,28 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from game import engine
+from bot import strategies
+from bot.simulation import simulate
+
+
+class Command(BaseCommand):
+    help = 'Let the bots play complete games against each other on the rules engine and report the throughput'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--games', type='int', default=1000, help='The amount of games to play'),
+        make_option('--rounds', type='int', default=4, help='The amount of rounds in every game'),
+        make_option('--seed', type='int', default=None, help='Seed for shuffling the decks'),
+        make_option('--strategy', choices=sorted(strategies), default='simple', help='The strategy every bot plays with'),
+    )
+
+    def handle(self, *args, **options):
+        result = simulate(options['games'], rounds=options['rounds'], seed=options['seed'],
+                          players=[strategies[options['strategy']]] * engine.PLAYERS)
+
+        self.stdout.write('Played %d games, %d rounds and %d tricks in %.2f seconds' % (result.games, result.rounds, result.tricks, result.seconds))
+        self.stdout.write('%.1f games/s, %.1f tricks/s' % (result.games_per_second(), result.tricks_per_second()))
+        self.stdout.write('%d rule violations' % sum(result.violations.values()))
+        for violation, count in result.violations.most_common():
+            self.stdout.write('  %6d  %s' % (count, violation))
@@ -0,0 +1,179 @@
+"""
+A bot that looks ahead by sampling the cards it cannot see.
+
+The bot does not know the hands of the other players. For every choice it
+deals the unseen cards at random over the other seats, in a way that fits
+what the play so far has shown: a player that did not follow suit has no
+cards of that suit left and the bidder never holds the mate card. On such a
+sampled deal every option is played out to the end of the round by players
+picking random legal cards, and the option earning the bot the most points
+over all samples wins.
+
+Sampling stops when the time budget of the move is spent, so a busy server
+makes the bots weaker rather than slower. At least one sample is always
+taken. Without a time budget only the amount of samples limits the bot,
+which makes its choices depend on its seed alone.
+
+"""
+import random
+import time
+
+import numpy
+
+from game import engine, cardset
+from bot import bidding
+from bot.strategy import Strategy
+
+# How often a deal that fits what was shown is tried before the unseen cards are dealt without looking at it
+DEAL_ATTEMPTS = 20
+
+
+def unseen_cards(round_state, seat):
+    """
+    Returns the set of cards that are still in the hands of the other seats
+    than the given one
+
+    """
+    return cardset.FULL & ~round_state.played & ~round_state.hands[seat]
+
+def allowed_cards(round_state, seat):
+    """
+    Returns for every seat the set of cards the given seat can tell it might
+    still hold
+
+    """
+    allowed = [cardset.FULL] * engine.PLAYERS
+    for trick in round_state.tricks:
+        requested_suit = trick.requested_suit
+        for other, card in trick.plays[1:]:
+            if engine.card_suit(card) != requested_suit:
+                allowed[other] &= ~cardset.SUIT_MASKS[requested_suit]
+    if round_state.mate_card is not None and round_state.bidder != seat:
+        allowed[round_state.bidder] &= ~cardset.bit(round_state.mate_card)
+    return allowed
+
+def deal_unseen(round_state, seat, rng):
+    """
+    Returns hands for every seat: the hand of the given seat and a random
+    deal of the unseen cards over the other seats that fits the play so far
+    when one is found, where every seat gets as many cards as it holds
+
+    """
+    others = [other for other in range(engine.PLAYERS) if other != seat]
+    unseen = cardset.cards(unseen_cards(round_state, seat))
+    allowed = allowed_cards(round_state, seat)
+
+    for _ in range(DEAL_ATTEMPTS):
+        hands = list(round_state.hands)
+        needed = dict((other, cardset.count(round_state.hands[other])) for other in others)
+        for other in others:
+            hands[other] = cardset.EMPTY
+
+        # Deal the cards with the fewest possible owners first
+        rng.shuffle(unseen)
+        owners = dict((card, [other for other in others if cardset.contains(allowed[other], card)]) for card in unseen)
+        for card in sorted(unseen, key=lambda card: len(owners[card])):
+            candidates = [other for other in owners[card] if needed[other]]
+            if not candidates:
+                break
+            # Picking an owner in proportion to its open places keeps the deal close to uniform
+            pick = rng.randrange(sum(needed[other] for other in candidates))
+            for other in candidates:
+                pick -= needed[other]
+                if pick < 0:
+                    break
+            hands[other] |= cardset.bit(card)
+            needed[other] -= 1
+        else:
+            return hands
+
+    hands = list(round_state.hands)
+    rng.shuffle(unseen)
+    for other in others:
+        amount = cardset.count(round_state.hands[other])
+        hands[other], unseen = cardset.from_cards(unseen[:amount]), unseen[amount:]
+    return hands
+
+def determinize(round_state, seat, rng):
+    """
+    Returns a copy of the given round in which the hands of the other seats
+    are replaced by a random deal of the cards the given seat cannot see
+
+    """
+    sample = round_state.copy()
+    sample.hands = deal_unseen(round_state, seat, rng)
+    if sample.mate_card is not None and not engine.mate_card_played(sample):
+        sample.mate = engine.owner(sample, sample.mate_card)
+    return sample
+
+def rollout(round_state, rng):
+    """
+    Play the given round to its end, every seat playing a random card it is
+    allowed to play
+
+    """
+    while engine.current_phase(round_state) is engine.TRICK_TAKING_PHASE:
+        trick = engine.current_trick(round_state)
+        if trick.is_done():
+            engine.collect(round_state, engine.trick_winner(round_state, trick))
+            continue
+        seat = engine.next_to_play(trick)
+        engine.play_card(round_state, seat, rng.choice(cardset.cards(engine.legal_plays(round_state, seat))))
+
+
+class MonteCarloStrategy(Strategy):
+    """
+    Picks the trump and mate suit and the cards to play by sampling the
+    unseen cards, see the module documentation. The bids come from the hand
+    evaluator in bot.bidding.
+
+    """
+    def __init__(self, seconds, max_samples=1000, seed=None):
+        # The time budget of a single move, None to stop at max_samples only
+        self.seconds = seconds
+        self.max_samples = max_samples
+        self.seed(seed)
+
+    def seed(self, seed):
+        self.rng = random.Random(seed)
+        self.numpy_rng = numpy.random.RandomState(seed)
+
+    def choose_bid(self, round_state, seat):
+        return bidding.choose_bid(round_state, seat, rng=self.numpy_rng)
+
+    def best_option(self, round_state, seat, options, apply):
+        """
+        Returns the option that earns the given seat the most points on
+        average, after apply(round_state, seat, option) took it on a sampled
+        deal. On a tie the first of the best options is returned.
+
+        """
+        if len(options) == 1:
+            return options[0]
+
+        deadline = time.time() + self.seconds if self.seconds is not None else None
+        totals = [0] * len(options)
+        samples = 0
+        while samples < self.max_samples and (samples == 0 or deadline is None or time.time() < deadline):
+            sample = determinize(round_state, seat, self.rng)
+            for index, option in enumerate(options):
+                played = sample.copy()
+                apply(played, seat, option)
+                rollout(played, self.rng)
+                totals[index] += engine.round_points(played)[seat]
+            samples += 1
+        return options[totals.index(max(totals))]
+
+    def choose_finalization(self, round_state, seat):
+        finalizations = [finalization[:2] for finalization in engine.legal_finalizations(round_state, seat)]
+        if not finalizations:
+            raise engine.GameException('Seat {} has no bid to finalize'.format(seat))
+        return self.best_option(round_state, seat, finalizations,
+                                lambda played, seat, option: engine.finalize_bid(played, seat, *option))
+
+    def choose_card(self, round_state, seat):
+        # The lowest cards first, so a tie saves the high cards
+        legal = sorted(cardset.cards(engine.legal_plays(round_state, seat)), key=engine.card_worth)
+        if not legal:
+            raise engine.GameException('Seat {} has no card to play'.format(seat))
+        return self.best_option(round_state, seat, legal, engine.play_card)
@@ -0,0 +1,100 @@
+"""
+Running bot turns outside of the requests of the human players.
+
+Whenever a game might be waiting for a bot, the game is scheduled. A fixed
+pool of worker threads takes the scheduled games and lets the bots take their
+turns, one action per run. A game is never run by two workers at the same
+time: scheduling a game that is already queued or running only marks it to
+be run once more afterwards, so the actions of the bots in a game are taken
+in order while unrelated games proceed in parallel.
+
+With settings.BOT_SYNCHRONOUS the runs are done right away in the thread
+that schedules them, which is handy for tests and the development server.
+
+"""
+import logging
+import threading
+import time
+import Queue
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# How often a bot turn failing on the database is tried, and the pause before the first retry in seconds
+TURN_ATTEMPTS = 3
+RETRY_DELAY = 0.05
+
+
+class BotScheduler(object):
+
+    def __init__(self, take_turn, workers=4):
+        self.take_turn = take_turn
+        self.workers = workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        # For every game that is queued or running: whether it has to be run again after the current run
+        self._scheduled = {}
+
+    def schedule(self, game_id):
+        with self._lock:
+            if game_id in self._scheduled:
+                self._scheduled[game_id] = True
+                return
+            self._scheduled[game_id] = False
+
+            if not settings.BOT_SYNCHRONOUS:
+                self._start_workers()
+                self._queue.put(game_id)
+                return
+
+        self._run(game_id)
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name='bot-worker-%d' % len(self._threads))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            game_id = self._queue.get()
+            close_old_connections()
+            try:
+                self._run(game_id)
+            finally:
+                close_old_connections()
+
+    def _run(self, game_id):
+        while True:
+            self._take_turn(game_id)
+
+            with self._lock:
+                if not self._scheduled[game_id]:
+                    del self._scheduled[game_id]
+                    return
+                self._scheduled[game_id] = False
+
+    def _take_turn(self, game_id):
+        """
+        A bot turn is a single unit of work, so a turn that failed on the
+        database left nothing behind and is tried again, for instance when it
+        ran into the write lock of another game's turn
+
+        """
+        for attempt in range(1, TURN_ATTEMPTS + 1):
+            try:
+                self.take_turn(game_id)
+                return
+            except DatabaseError:
+                if attempt == TURN_ATTEMPTS:
+                    logger.exception('Bot turn in game %s failed', game_id)
+                    return
+                logger.warning('Bot turn in game %s failed, trying again', game_id, exc_info=True)
+                time.sleep(RETRY_DELAY * attempt)
+            except Exception:
+                logger.exception('Bot turn in game %s failed', game_id)
+                return
@@ -0,0 +1,112 @@
+"""
+Bots playing complete games against each other on the rules engine, without
+requests or a database.
+
+Every simulated game is a number of rounds: the deck is shuffled and dealt,
+the bots bid, finalize their bid and play and collect the 13 tricks, and the
+round is settled into the scores. Anything the engine refuses and any broken
+rule found in a finished round is counted as a violation, after which the
+game is abandoned.
+
+"""
+import random
+import time
+from collections import Counter
+
+from game import engine, cardset
+from bot.strategy import Strategy
+
+
+class Violation(Exception):
+    pass
+
+# Everything that ends a simulated game as a violation
+RULE_ERRORS = (engine.GameException, engine.BadBidException, engine.IllegalChoiceException, engine.BadPlayException, Violation)
+
+
+class SimulationResult(object):
+
+    def __init__(self):
+        self.games = 0
+        self.rounds = 0
+        self.tricks = 0
+        self.seconds = 0.0
+        self.violations = Counter()
+
+    def games_per_second(self):
+        return self.games / self.seconds if self.seconds else 0.0
+
+    def tricks_per_second(self):
+        return self.tricks / self.seconds if self.seconds else 0.0
+
+
+def check_round(round_state, points):
+    """
+    Raise a Violation if the given finished round breaks a rule of the game
+
+    """
+    if engine.is_rik(round_state.bid) and len(round_state.tricks) != engine.TRICKS_PER_ROUND:
+        raise Violation('round ended after {} tricks'.format(len(round_state.tricks)))
+    for trick in round_state.tricks:
+        if len(trick.plays) != engine.PLAYERS or len(set(seat for seat, card in trick.plays)) != engine.PLAYERS:
+            raise Violation('trick without a card from every player')
+    if sum(engine.tricks_won(round_state, seat) for seat in range(engine.PLAYERS)) != len(round_state.tricks):
+        raise Violation('tricks won do not add up')
+    if len(round_state.tricks) == engine.TRICKS_PER_ROUND and round_state.played != cardset.FULL:
+        raise Violation('not every card was played')
+    if sum(points) != 0:
+        raise Violation('points do not add up: {}'.format(points))
+
+def play_round(game_state, players, rng, result):
+    deck = list(range(engine.DECK_SIZE))
+    rng.shuffle(deck)
+    round_state = engine.new_round(game_state, deck)
+
+    while engine.current_phase(round_state) is engine.BIDDING_PHASE:
+        seat = engine.next_bidder(round_state)
+        engine.place_bid(round_state, seat, players[seat].choose_bid(round_state, seat))
+
+    if engine.current_phase(round_state) is engine.FINALIZE_BIDDING_PHASE:
+        trump_suit, mate_suit = players[round_state.bidder].choose_finalization(round_state, round_state.bidder)
+        engine.finalize_bid(round_state, round_state.bidder, trump_suit, mate_suit)
+
+    while engine.current_phase(round_state) is engine.TRICK_TAKING_PHASE:
+        trick = engine.current_trick(round_state)
+        if trick.is_done():
+            engine.collect(round_state, engine.trick_winner(round_state, trick))
+            result.tricks += 1
+        else:
+            seat = engine.next_to_play(trick)
+            card = players[seat].choose_card(round_state, seat)
+            if card is None:
+                raise Violation('seat {} has no card it may play'.format(seat))
+            engine.play_card(round_state, seat, card)
+
+    points = engine.settle_round(game_state)
+    check_round(round_state, points)
+    result.rounds += 1
+
+def simulate(games, rounds=engine.PLAYERS, seed=None, players=None):
+    """
+    Let the bots play the given amount of games and return the results.
+    players holds the strategy for every seat, by default the bots play
+    Strategy.
+
+    """
+    if players is None:
+        players = [Strategy()] * engine.PLAYERS
+    rng = random.Random(seed)
+    result = SimulationResult()
+    started = time.time()
+
+    for _ in range(games):
+        game_state = engine.GameState()
+        try:
+            for _ in range(rounds):
+                play_round(game_state, players, rng, result)
+        except RULE_ERRORS as e:
+            result.violations['%s: %s' % (e.__class__.__name__, e)] += 1
+        result.games += 1
+
+    result.seconds = time.time() - started
+    return result
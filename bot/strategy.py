@@ -0,0 +1,51 @@
+"""
+The choices a bot makes, kept apart from the database like the rules engine.
+
+A strategy gets the round state of the engine and the seat of the bot and
+returns its bid, its trump and mate suit or the card it plays, or raises a
+GameException when the seat has nothing to choose from. Every
+strategy is registered under a name in bot.strategies, settings.BOT_STRATEGY
+picks the one the bots play with.
+
+"""
+from game import engine, cardset
+
+
+class Strategy(object):
+    """
+    The plainest bot: it passes whenever it can, picks clubs as trump and
+    plays the first card in its hand it is allowed to play
+
+    """
+    def seed(self, seed):
+        """
+        Start the random choices of the strategy over from the given seed
+
+        """
+        pass
+
+    def choose_bid(self, round_state, seat):
+        bids = engine.legal_bids(round_state, seat)
+        if engine.PASS in bids:
+            return engine.PASS
+        return bids[0]
+
+    def choose_finalization(self, round_state, seat):
+        """
+        Returns the (trump suit, mate suit) to finalize the bid with: clubs
+        as trump when allowed and the first mate suit that is allowed
+
+        """
+        finalizations = engine.legal_finalizations(round_state, seat)
+        if not finalizations:
+            raise engine.GameException('Seat {} has no bid to finalize'.format(seat))
+        for trump_suit, mate_suit, mate_card in finalizations:
+            if trump_suit == engine.CLUBS:
+                return trump_suit, mate_suit
+        return finalizations[0][:2]
+
+    def choose_card(self, round_state, seat):
+        legal = cardset.cards(engine.legal_plays(round_state, seat))
+        if not legal:
+            raise engine.GameException('Seat {} has no card to play'.format(seat))
+        return min(legal, key=lambda card: (engine.card_suit(card), engine.card_number(card)))
@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+
+import numpy
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from game import engine, cardset
+from bot import bidding
+from bot.strategy import Strategy
+from bot.montecarlo import MonteCarloStrategy, determinize, allowed_cards, unseen_cards
+from bot.scheduler import BotScheduler
+from bot.tournament import tournament, chunk_size, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE
+
+SEED = 1989
+
+
+class MonteCarloTest(TestCase):
+
+    def play_tricks(self, rng, tricks):
+        """
+        Returns a round in which the simple bots played the given amount of
+        tricks
+
+        """
+        deck = list(range(engine.DECK_SIZE))
+        rng.shuffle(deck)
+        round_state = engine.new_round(engine.GameState(), deck)
+        strategy = Strategy()
+        while engine.current_phase(round_state) is engine.BIDDING_PHASE:
+            seat = engine.next_bidder(round_state)
+            engine.place_bid(round_state, seat, strategy.choose_bid(round_state, seat))
+        engine.finalize_bid(round_state, round_state.bidder, *strategy.choose_finalization(round_state, round_state.bidder))
+
+        while engine.tricks_collected(round_state) < tricks or not engine.current_trick(round_state).plays:
+            trick = engine.current_trick(round_state)
+            if trick.is_done():
+                engine.collect(round_state, engine.trick_winner(round_state, trick))
+            else:
+                seat = engine.next_to_play(trick)
+                engine.play_card(round_state, seat, strategy.choose_card(round_state, seat))
+        return round_state
+
+    def test_determinize_fits_the_play(self):
+        rng = random.Random(SEED)
+        for tricks in range(1, 10):
+            round_state = self.play_tricks(rng, tricks)
+            seat = engine.next_to_play(engine.current_trick(round_state))
+            allowed = allowed_cards(round_state, seat)
+            sample = determinize(round_state, seat, rng)
+
+            self.assertEqual(sample.hands[seat], round_state.hands[seat])
+            others = cardset.EMPTY
+            for other in range(engine.PLAYERS):
+                self.assertEqual(cardset.count(sample.hands[other]), cardset.count(round_state.hands[other]))
+                if other != seat:
+                    self.assertEqual(sample.hands[other] & ~allowed[other], cardset.EMPTY)
+                    others |= sample.hands[other]
+            self.assertEqual(others, unseen_cards(round_state, seat))
+            self.assertEqual(len(sample.tricks), len(round_state.tricks))
+
+    def test_choose_card_leaves_the_round_alone(self):
+        rng = random.Random(SEED)
+        round_state = self.play_tricks(rng, 3)
+        seat = engine.next_to_play(engine.current_trick(round_state))
+        hands, plays = list(round_state.hands), list(engine.current_trick(round_state).plays)
+
+        card = MonteCarloStrategy(0, max_samples=5, seed=SEED).choose_card(round_state, seat)
+        self.assertTrue(cardset.contains(engine.legal_plays(round_state, seat), card))
+        self.assertEqual(round_state.hands, hands)
+        self.assertEqual(engine.current_trick(round_state).plays, plays)
+
+
+class SchedulerTest(TestCase):
+
+    @override_settings(BOT_SYNCHRONOUS=False)
+    def test_every_bot_moves_once(self):
+        bots = 3
+        moves = []
+        running = []
+        overlaps = []
+        done = threading.Event()
+
+        def take_turn(game_id):
+            # Like a bot turn: the bot whose turn it is moves and its move schedules the next bot
+            running.append(game_id)
+            overlaps.append(running.count(game_id) > 1)
+            time.sleep(0.01)
+            if len(moves) < bots:
+                moves.append(len(moves))
+                if len(moves) < bots:
+                    scheduler.schedule(game_id)
+                else:
+                    done.set()
+            running.remove(game_id)
+
+        scheduler = BotScheduler(take_turn, workers=2)
+        scheduler.schedule(1)
+        scheduler.schedule(1)
+        self.assertTrue(done.wait(5))
+        for _ in range(100):
+            if not scheduler._scheduled:
+                break
+            time.sleep(0.01)
+
+        self.assertFalse(scheduler._scheduled)
+        self.assertEqual(moves, list(range(bots)))
+        self.assertNotIn(True, overlaps)
+
+
+class BiddingTest(TestCase):
+
+    def hand(self, cards):
+        return cardset.from_cards(engine.card(suit, number) for suit, number in cards)
+
+    def test_all_trumps_bids_vooralles(self):
+        hand = self.hand((engine.SPADES, number) for number in range(1, 14))
+        points = bidding.evaluate_hand(hand, rng=numpy.random.RandomState(SEED))
+        self.assertEqual(points[engine.OPENALLES, engine.SPADES], engine.POINTS[engine.OPENALLES])
+        self.assertEqual(points.max(axis=1).argmax(), engine.OPENALLES)
+
+    def test_low_cards_bid_miserie(self):
+        hand = self.hand([(suit, number) for suit in engine.SUITS for number in (2, 3, 4)] + [(engine.CLUBS, 5)])
+        points = bidding.evaluate_hand(hand, rng=numpy.random.RandomState(SEED))
+        self.assertEqual(points.max(axis=1).argmax(), engine.MISERIE)
+
+    def test_evaluate_hands_in_bulk(self):
+        rng = random.Random(SEED)
+        hands = []
+        for _ in range(bidding.CHUNK_SIZE + 10):
+            deck = list(range(engine.DECK_SIZE))
+            rng.shuffle(deck)
+            hands.append(cardset.from_cards(deck[:engine.TRICKS_PER_ROUND]))
+        points = bidding.evaluate_hands(hands, samples=20, rng=numpy.random.RandomState(SEED))
+        self.assertEqual(points.shape, (len(hands), len(engine.BIDS), len(engine.SUITS)))
+        self.assertTrue((points[:, engine.PASS] == 0).all())
+
+    def test_choose_bid_is_legal(self):
+        rng = random.Random(SEED)
+        for _ in range(20):
+            deck = list(range(engine.DECK_SIZE))
+            rng.shuffle(deck)
+            round_state = engine.new_round(engine.GameState(), deck)
+            while engine.current_phase(round_state) is engine.BIDDING_PHASE:
+                seat = engine.next_bidder(round_state)
+                bid = bidding.choose_bid(round_state, seat, samples=20, rng=numpy.random.RandomState(SEED))
+                self.assertIn(bid, engine.legal_bids(round_state, seat))
+                engine.place_bid(round_state, seat, bid)
+
+
+class TournamentTest(TestCase):
+
+    def test_seeded_tournament_repeats(self):
+        players = {'simple': Strategy(), 'montecarlo': MonteCarloStrategy(1, max_samples=2)}
+        lineup = ['montecarlo', 'simple', 'montecarlo', 'simple']
+        results = [tournament(lineup, players, 6, rounds=1, seed=SEED, workers=1) for _ in range(2)]
+
+        for result in results:
+            self.assertEqual(result.games, 6)
+            # Every game counts once for every strategy, not once for every seat
+            self.assertEqual([strategy.games for strategy in result.strategies.values()], [6, 6])
+            self.assertAlmostEqual(sum(strategy.wins for strategy in result.strategies.values()), 6)
+            self.assertAlmostEqual(sum(strategy.points for strategy in result.strategies.values()), 0)
+        self.assertEqual(results[0].strategies['montecarlo'].scores, results[1].strategies['montecarlo'].scores)
+
+    def test_chunks_for_every_worker(self):
+        self.assertEqual(chunk_size(200, 4), 12)
+        self.assertEqual(chunk_size(10, 4), MIN_CHUNK_SIZE)
+        self.assertEqual(chunk_size(100000, 4), MAX_CHUNK_SIZE)
+
+    def test_seeded_command_repeats(self):
+        outputs = []
+        for _ in range(2):
+            out = StringIO()
+            call_command('bot_tournament', games=1, rounds=1, seed=SEED, stdout=out)
+            # Leave out the line with the time it took
+            outputs.append(out.getvalue().splitlines()[1:])
+        self.assertIn('0 rule violations', outputs[0])
+        self.assertEqual(outputs[0], outputs[1])
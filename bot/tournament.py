@@ -0,0 +1,213 @@
+"""
+Bot strategies playing seeded games against each other on a pool of worker
+processes.
+
+The games are split into chunks that are played independently: every chunk
+gets its own seed, drawn from the seed of the tournament, and every worker
+process plays its chunks on its own engine. The lineup of strategies moves
+one seat on with every game, so every strategy plays every seat equally
+often. The workers only send back the totals of their chunks, which are
+merged into the result of the tournament. The chunks are sized so every
+worker gets several of them, so the seed of a tournament repeats its games
+for the same amount of workers.
+
+A strategy wins a game when one of its seats ends with the highest score,
+a win shared by several seats counts for a part. The score of a strategy in
+a game is the mean of the points its seats earned. The seats of a strategy
+play the same deals, so every game counts once for every strategy in the
+statistics rather than once for every seat.
+
+"""
+import math
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from game import engine
+from bot.simulation import SimulationResult, RULE_ERRORS, play_round
+
+# The least and the most games in a chunk that is handed to a worker, and the
+# amount of chunks every worker should get to keep them all busy to the end
+MIN_CHUNK_SIZE = 5
+MAX_CHUNK_SIZE = 50
+CHUNKS_PER_WORKER = 4
+# The z-value of the 95% confidence intervals
+Z = 1.96
+
+
+class StrategyResult(object):
+    """
+    The games one strategy played in a tournament: its wins and the points
+    it scored, counted once for every game
+
+    """
+    def __init__(self):
+        self.games = 0
+        self.wins = 0.0
+        self.points = 0
+        self.squares = 0
+        self.scores = Counter()
+
+    def add(self, points, win):
+        self.games += 1
+        self.wins += win
+        self.points += points
+        self.squares += points * points
+        self.scores[points] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins += other.wins
+        self.points += other.points
+        self.squares += other.squares
+        self.scores.update(other.scores)
+
+    def win_rate(self):
+        return self.wins / self.games if self.games else 0.0
+
+    def win_rate_interval(self):
+        """
+        Returns the 95% Wilson score interval of the win rate
+
+        """
+        if not self.games:
+            return 0.0, 0.0
+        rate = self.win_rate()
+        center = (rate + Z * Z / (2 * self.games)) / (1 + Z * Z / self.games)
+        spread = Z * math.sqrt(rate * (1 - rate) / self.games + Z * Z / (4 * self.games * self.games)) / (1 + Z * Z / self.games)
+        return center - spread, center + spread
+
+    def mean_score(self):
+        return float(self.points) / self.games if self.games else 0.0
+
+    def score_interval(self):
+        """
+        Returns the 95% confidence interval of the mean score
+
+        """
+        if self.games < 2:
+            return self.mean_score(), self.mean_score()
+        variance = (self.squares - self.points * self.mean_score()) / (self.games - 1)
+        spread = Z * math.sqrt(max(variance, 0.0) / self.games)
+        return self.mean_score() - spread, self.mean_score() + spread
+
+    def percentile(self, fraction):
+        """
+        Returns the score that the given fraction of the games did not
+        exceed
+
+        """
+        remaining = fraction * self.games
+        for score in sorted(self.scores):
+            remaining -= self.scores[score]
+            if remaining <= 0:
+                return score
+        return max(self.scores) if self.scores else 0
+
+
+class TournamentResult(object):
+
+    def __init__(self):
+        self.games = 0
+        self.rounds = 0
+        self.tricks = 0
+        self.seconds = 0.0
+        self.violations = Counter()
+        # The results by strategy name
+        self.strategies = {}
+
+    def strategy(self, name):
+        if name not in self.strategies:
+            self.strategies[name] = StrategyResult()
+        return self.strategies[name]
+
+    def merge(self, other):
+        self.games += other.games
+        self.rounds += other.rounds
+        self.tricks += other.tricks
+        self.violations.update(other.violations)
+        for name, strategy in other.strategies.items():
+            self.strategy(name).merge(strategy)
+
+    def games_per_second(self):
+        return self.games / self.seconds if self.seconds else 0.0
+
+
+def play_chunk(chunk):
+    """
+    Play a chunk of a tournament and return its TournamentResult. A chunk is
+    a tuple of the lineup (the strategy names, one for every seat), the
+    strategies by name, the amount of games and rounds, the seed and the
+    number of its first game in the tournament.
+
+    """
+    lineup, players, games, rounds, seed, first_game = chunk
+    rng = random.Random(seed)
+    for strategy in players.values():
+        strategy.seed(rng.getrandbits(32))
+
+    result = TournamentResult()
+    simulation = SimulationResult()
+    for game in range(first_game, first_game + games):
+        shift = game % engine.PLAYERS
+        names = lineup[shift:] + lineup[:shift]
+        game_state = engine.GameState()
+        start_scores = list(game_state.scores)
+        result.games += 1
+        try:
+            for _ in range(rounds):
+                play_round(game_state, [players[name] for name in names], rng, simulation)
+        except RULE_ERRORS as e:
+            result.violations['%s: %s' % (e.__class__.__name__, e)] += 1
+            continue
+
+        best = max(game_state.scores)
+        winners = game_state.scores.count(best)
+        for name in set(names):
+            seats = [seat for seat in range(engine.PLAYERS) if names[seat] == name]
+            win = sum(1.0 / winners for seat in seats if game_state.scores[seat] == best)
+            points = sum(game_state.scores[seat] - start_scores[seat] for seat in seats)
+            result.strategy(name).add(float(points) / len(seats), win)
+
+    result.rounds = simulation.rounds
+    result.tricks = simulation.tricks
+    return result
+
+def chunk_size(games, workers):
+    """
+    Returns the amount of games in a chunk of a tournament of the given
+    amount of games on the given amount of workers
+
+    """
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, games // (workers * CHUNKS_PER_WORKER)))
+
+def tournament(lineup, players, games, rounds=engine.PLAYERS, seed=None, workers=None):
+    """
+    Let the strategies in the given lineup (a strategy name for every seat)
+    play the given amount of games on the given amount of worker processes,
+    one for every CPU by default. players holds the strategy for every name.
+
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    size = chunk_size(games, workers)
+    rng = random.Random(seed)
+    chunks = [(list(lineup), players, min(size, games - first_game), rounds, rng.getrandbits(32), first_game)
+              for first_game in range(0, games, size)]
+
+    result = TournamentResult()
+    started = time.time()
+    if workers == 1:
+        for chunk in chunks:
+            result.merge(play_chunk(chunk))
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for chunk_result in pool.imap_unordered(play_chunk, chunks):
+                result.merge(chunk_result)
+        finally:
+            pool.close()
+            pool.join()
+    result.seconds = time.time() - started
+    return result
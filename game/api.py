@@ -0,0 +1,248 @@
+"""
+The state of a game as seen by one of its players, as plain data that can be
+sent to the browser as JSON.
+
+Only the cards of the viewer are shown, the hands of the other players are
+reduced to the amount of cards they hold. The last view sent to every viewer
+is remembered so the next request only needs the parts that changed.
+
+"""
+from collections import OrderedDict
+from itertools import groupby
+import threading
+
+from game import engine, cardset
+from game.models import Game, Round, Bid, Card, Score
+
+# The amount of (game, viewer) pairs to remember the last view for
+VIEW_CACHE_SIZE = 4096
+
+
+def card_identifier(card):
+    return Card.IDENTIFIERS[card]
+
+def trick_view(trick_state):
+    if trick_state is None:
+        return None
+    return [[seat, card_identifier(card)] for seat, card in trick_state.plays]
+
+
+
+def table_view(game, viewer):
+    """
+    Returns everything the given player may know about the given game
+
+    """
+    viewer_seat = game.seat_of(viewer.id)
+    round = game.current_round
+    # The hands, tricks and legal moves need the full round state, the phase is stored with the round
+    state = round.state() if round is not None else None
+    phase = round.current_phase() if round is not None else None
+
+    view = {
+        'seat': viewer_seat,
+        'game_state': game.current_state(),
+        'round_number': game.round_number,
+        'phase': phase,
+        'ended': False,
+        'players': [],
+        'hand': [],
+        'bids': [],
+        'highest_bid': None,
+        'mate': None,
+        'turn': None,
+        'trick': None,
+        'previous_trick': None,
+        'result': None,
+        'actions': {},
+    }
+
+    for isplaying in game.isplaying_set.all():
+        player = {'seat': isplaying.seat, 'username': isplaying.player.username, 'score': isplaying.score,
+                  'cards': None, 'tricks': None, 'dealer': False}
+        if state is not None:
+            player['cards'] = cardset.count(state.hands[isplaying.seat])
+            player['tricks'] = engine.tricks_won(state, isplaying.seat)
+            player['dealer'] = isplaying.seat == state.dealer
+        view['players'].append(player)
+        if isplaying.abandoned:
+            view['ended'] = True
+
+    if state is None:
+        if view['game_state'] is Game.BEFORE_ROUND:
+            view['actions']['start_round'] = True
+        return view
+
+    view['hand'] = [card_identifier(card) for card in cardset.cards(state.hands[viewer_seat])]
+    view['bids'] = [[seat, bid] for seat, bid in state.bids]
+
+    if state.bid is not None:
+        view['highest_bid'] = {'seat': state.bidder, 'bid': state.bid, 'trump_suit': state.trump_suit,
+                               'mate_suit': state.mate_suit, 'mate_card': None}
+        if state.mate_card is not None:
+            view['highest_bid']['mate_card'] = engine.card_number(state.mate_card)
+        if engine.mate_card_played(state):
+            view['mate'] = state.mate
+
+    if phase is Round.BIDDING_PHASE:
+        view['turn'] = round.next_bidder_seat()
+        if view['turn'] == viewer_seat:
+            view['actions']['bid'] = engine.legal_bids(state, viewer_seat)
+
+    elif phase is Round.FINALIZE_BIDDING_PHASE:
+        view['turn'] = state.bidder
+        if state.bidder == viewer_seat:
+            view['actions']['finalize'] = [[trump_suit, mate_suit, engine.card_number(mate_card) if mate_card is not None else None]
+                                           for trump_suit, mate_suit, mate_card in engine.legal_finalizations(state, viewer_seat)]
+
+    elif phase is Round.TRICK_TAKING_PHASE:
+        trick = engine.current_trick(state)
+        view['trick'] = trick_view(trick)
+        view['previous_trick'] = trick_view(engine.previous_trick(state))
+        if trick.is_done():
+            view['turn'] = engine.trick_winner(state, trick)
+            if view['turn'] == viewer_seat:
+                view['actions']['collect'] = True
+        else:
+            view['turn'] = engine.next_to_play(trick)
+            if view['turn'] == viewer_seat:
+                view['actions']['play'] = [card_identifier(card) for card in cardset.cards(engine.legal_plays(state, viewer_seat))]
+
+    else:
+        view['previous_trick'] = trick_view(engine.current_trick(state))
+        view['result'] = {'tricks': engine.asking_team_tricks(state), 'won': engine.asking_team_won(state),
+                          'points': engine.asking_team_points(state), 'other_points': engine.other_player_points(state)}
+        view['actions']['start_round'] = True
+
+    return view
+
+
+
+def card_display(card, playable=False):
+    return {'identifier': Card.IDENTIFIERS[card], 'image_file': Card.IMAGE_FILES[card], 'playable': playable}
+
+def trick_display(view, seating, viewer):
+    if view is None:
+        return None
+    return [dict(card_display(Card.INDICES[identifier]), position=seating.relative_seat(viewer.id, seat) + 1)
+            for seat, identifier in view]
+
+def table_display(game, viewer, view):
+    """
+    Returns what the game page needs to draw the table for the given player,
+    built from his table view: the players in seat order with their position
+    on the screen, roles, bids, tricks and cards, the cards on the table, the
+    state of the bidding, the result of a finished round and the score history.
+    The templates render from this instead of asking the models for every
+    player, card and round.
+
+    """
+    seating = game.seating()
+    round = game.current_round
+
+    last_bids = {}
+    bidding_high = None
+    if round is not None and view['phase'] is Round.BIDDING_PHASE:
+        bids = round.all_bids()
+        for bid in sorted(bids, key=lambda bid: bid.id):
+            last_bids[bid.player_id] = bid
+        # The bids are ordered from high to low
+        if bids and bids[0].bid != Bid.PASS:
+            bidding_high = bids[0]
+
+    highest_bid = view['highest_bid']
+    playable = set(view['actions'].get('play', ()))
+
+    display = {
+        'players': [],
+        'viewer': None,
+        'turn': seating.player_at(view['turn']) if view['turn'] is not None else None,
+        'trick': trick_display(view['trick'], seating, viewer),
+        'previous_trick': trick_display(view['previous_trick'], seating, viewer),
+        'trick_done': view['trick'] is not None and len(view['trick']) == engine.PLAYERS,
+        'bidding_high': bidding_high,
+        'result': None,
+        'score_history': score_history(game),
+    }
+
+    if view['result'] is not None:
+        display['result'] = dict(view['result'], mate=seating.player_at(view['mate']) if view['mate'] is not None else None)
+
+    for player_view in view['players']:
+        seat = player_view['seat']
+        isplaying = seating.isplaying_at(seat)
+        player = {
+            'isplaying': isplaying,
+            'player': isplaying.player,
+            'username': player_view['username'],
+            'score': player_view['score'],
+            'position': seating.relative_seat(viewer.id, seat),
+            'is_viewer': seat == view['seat'],
+            'dealer': player_view['dealer'],
+            'bidder': highest_bid is not None and highest_bid['seat'] == seat,
+            'mate': view['mate'] == seat,
+            'turn': view['turn'] == seat,
+            'tricks': player_view['tricks'],
+            'last_bid': last_bids.get(isplaying.player_id),
+            'cards': [],
+            'hidden_cards': (),
+        }
+        if player['is_viewer']:
+            player['cards'] = [card_display(Card.INDICES[identifier], identifier in playable) for identifier in view['hand']]
+            display['viewer'] = player
+        elif player_view['cards']:
+            player['hidden_cards'] = range(player_view['cards'])
+        display['players'].append(player)
+
+    return display
+
+def score_history(game):
+    """
+    Returns the scores of the players at the start of every round of the
+    given game, the latest round first, in one query
+
+    """
+    scores = Score.objects.filter(round__game=game).order_by('-round__id', 'id').values_list('round_id', 'score')
+    return [[score for round_id, score in round_scores] for round_id, round_scores in groupby(scores, lambda row: row[0])]
+
+class ViewCache(object):
+    """
+    Remembers the last view sent to every (game, viewer) pair
+
+    """
+
+    def __init__(self, max_size=VIEW_CACHE_SIZE):
+        self.max_size = max_size
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+
+    def swap(self, key, version, view):
+        """
+        Store the given view and return the (version, view) stored before
+
+        """
+        with self._lock:
+            previous = self._views.pop(key, None)
+            self._views[key] = (version, view)
+            while len(self._views) > self.max_size:
+                self._views.popitem(last=False)
+            return previous
+
+
+view_cache = ViewCache()
+
+
+def table_update(game, viewer, since=None):
+    """
+    Returns the view of the given player on the given game. If the view sent
+    for version `since` is still known, only the parts that changed since
+    then are included.
+
+    """
+    view = table_view(game, viewer)
+    previous = view_cache.swap((game.id, viewer.id), game.version, view)
+
+    if since is not None and previous is not None and previous[0] == since:
+        changes = dict((key, value) for key, value in view.items() if previous[1].get(key) != value)
+        return {'version': game.version, 'since': since, 'full': False, 'changes': changes}
+    return {'version': game.version, 'full': True, 'changes': view}
@@ -0,0 +1,88 @@
+"""
+Sets of cards stored in a single integer, one bit per card.
+
+Bit n stands for the card with index n in the game engine (see engine.card).
+Every suit takes up 13 consecutive bits, ordered by the worth of the cards,
+so most questions about a hand come down to a mask and a bit count.
+
+"""
+
+SUIT_SIZE = 13
+EMPTY = 0
+FULL = (1 << (4 * SUIT_SIZE)) - 1
+
+# All cards of a suit
+SUIT_MASKS = tuple(((1 << SUIT_SIZE) - 1) << (suit * SUIT_SIZE) for suit in range(4))
+
+# The card with the same rank (the worth - 1) in every suit, RANK_MASKS[12] are the aces
+RANK_MASKS = tuple(sum(1 << (suit * SUIT_SIZE + rank) for suit in range(4)) for rank in range(SUIT_SIZE))
+
+
+def bit(card):
+    return 1 << card
+
+def from_cards(cards):
+    cardset = EMPTY
+    for card in cards:
+        cardset |= 1 << card
+    return cardset
+
+def cards(cardset):
+    """
+    Returns the cards in the given set, lowest card first
+
+    """
+    result = []
+    while cardset:
+        lowest_bit = cardset & -cardset
+        result.append(lowest_bit.bit_length() - 1)
+        cardset ^= lowest_bit
+    return result
+
+def contains(cardset, card):
+    return bool(cardset >> card & 1)
+
+def count(cardset):
+    return bin(cardset).count('1')
+
+def in_suit(cardset, suit):
+    return cardset & SUIT_MASKS[suit]
+
+def has_suit(cardset, suit):
+    return bool(cardset & SUIT_MASKS[suit])
+
+def suit_lengths(cardset):
+    return [count(cardset & mask) for mask in SUIT_MASKS]
+
+def highest(cardset):
+    """
+    Returns the highest card in the given set, None if it is empty. Between
+    suits, spades are higher than hearts, diamonds and clubs.
+
+    """
+    if not cardset:
+        return None
+    return cardset.bit_length() - 1
+
+def lowest(cardset):
+    if not cardset:
+        return None
+    return (cardset & -cardset).bit_length() - 1
+
+def highest_in_suit(cardset, suit):
+    return highest(cardset & SUIT_MASKS[suit])
+
+def lowest_in_suit(cardset, suit):
+    return lowest(cardset & SUIT_MASKS[suit])
+
+def high_cards(cardset, lowest_rank):
+    """
+    Returns how many cards in the given set have at least the given rank (the
+    worth of a card - 1), e.g. high_cards(hand, 10) counts the queens, kings
+    and aces
+
+    """
+    mask = EMPTY
+    for rank in range(lowest_rank, SUIT_SIZE):
+        mask |= RANK_MASKS[rank]
+    return count(cardset & mask)
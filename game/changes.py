@@ -0,0 +1,145 @@
+"""
+Running an action on a game as a single unit of work.
+
+A single action saves several rows of a game, and every save calls
+Game.changed. Inside a `game_changes.collect()` block those calls only mark
+the game as changed; when the outermost block ends, every changed game gets
+its version raised once and its players notified once. Outside of a block a
+change is published right away.
+
+`unit_of_work(game_id)` runs an action while holding the lock of the game,
+in one database transaction that also raises the versions of the changed
+games. The players are only notified after the transaction is committed, so
+nobody reads the game halfway through an action. When an action fails
+nothing is published for it. Work that has to wait for the changes to be
+published, like scheduling the bot turns that follow an action, is handed
+to `game_changes.after()`.
+
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import threading
+
+from django.db import connection, transaction
+
+from game.locks import game_locks
+
+
+class ChangeCollector(threading.local):
+
+    def __init__(self):
+        self.depth = 0
+        # The changed games by id, in the order they first changed: [game, whether its version is raised]
+        self.pending = OrderedDict()
+        # The callbacks to call once the changes are published
+        self.callbacks = []
+
+    def changed(self, game):
+        if self.depth == 0:
+            game.raise_version()
+            game.announce()
+        elif game.id not in self.pending:
+            self.pending[game.id] = [game, False]
+
+    def after(self, callback):
+        """
+        Call the given callback once the changes are published: right away
+        outside of a block, or when the outermost block ends. It is dropped
+        when its block fails.
+
+        """
+        if self.depth == 0:
+            callback()
+        else:
+            self.callbacks.append(callback)
+
+    @contextmanager
+    def collect(self):
+        # What to go back to when the block fails, its changes are rolled back with its transaction
+        pending = OrderedDict((game_id, list(entry)) for game_id, entry in self.pending.items())
+        callbacks = len(self.callbacks)
+        self.depth += 1
+        try:
+            yield
+        except:
+            self.pending = pending
+            del self.callbacks[callbacks:]
+            raise
+        finally:
+            self.depth -= 1
+        if self.depth == 0:
+            self.flush()
+
+    def raise_versions(self):
+        """
+        Raise the versions of the games changed so far, they are announced
+        when the outermost block ends
+
+        """
+        for entry in self.pending.values():
+            if not entry[1]:
+                entry[0].raise_version()
+                entry[1] = True
+
+    def flush(self):
+        pending, self.pending = self.pending, OrderedDict()
+        callbacks, self.callbacks = self.callbacks, []
+        for game, raised in pending.values():
+            if not raised:
+                game.raise_version()
+            game.announce()
+        for callback in callbacks:
+            callback()
+
+
+game_changes = ChangeCollector()
+
+
+# SQLite lets a single connection write at a time, and two transactions that
+# read before they write can deadlock when both upgrade their locks. With
+# SQLite the transactions of the units of work of this process take turns
+# instead, every database file on its own. Nothing but the transaction of a
+# single action runs in a turn: the bots choose their moves before their unit
+# of work and are only scheduled once the action before them is committed.
+_sqlite_turns = {}
+_sqlite_turns_lock = threading.Lock()
+
+def sqlite_turn(name):
+    """
+    Returns the lock the units of work on the given SQLite database take
+    turns with
+
+    """
+    with _sqlite_turns_lock:
+        if name not in _sqlite_turns:
+            _sqlite_turns[name] = threading.RLock()
+        return _sqlite_turns[name]
+
+@contextmanager
+def database_turn():
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with sqlite_turn(connection.settings_dict['NAME']):
+        yield
+
+@contextmanager
+def unit_of_work(game_id):
+    with game_locks.hold(game_id), game_changes.collect():
+        with database_turn(), transaction.atomic():
+            yield
+            game_changes.raise_versions()
+
+
+def game_action(view):
+    """
+    Decorator running a view that acts on the game with the given game_id as
+    a unit of work
+
+    """
+    @wraps(view)
+    def wrapper(request, game_id, *args, **kwargs):
+        with unit_of_work(int(game_id)):
+            return view(request, game_id, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,753 @@
+"""
+The rules of Rikken, kept apart from the database.
+
+The state classes in this module hold everything that is needed to validate
+and apply the actions of the players in memory. The functions only read and
+update these state objects, they never touch the database. Loading the state
+from and persisting it to the database is up to the models in game.models.
+
+Players are identified by their seat number (0 to 3) and cards by their index
+in the deck, see card(). Hands and the cards in a trick are card sets, see
+game.cardset.
+
+"""
+from game import cardset
+
+PLAYERS = 4
+TRICKS_PER_ROUND = 13
+DECK_SIZE = 52
+DEAL_ORDER = (4, 4, 5)
+
+# Suits
+CLUBS, DIAMONDS, HEARTS, SPADES = 0, 1, 2, 3
+SUITS = (CLUBS, DIAMONDS, HEARTS, SPADES)
+
+# Bids
+PASS, RIK, RIKp1, MISERIE, RIKp2, RIKp3, OPENMISERIEKAART, OPENALLESKAART, RIKp4, RIKp5, OPENMISERIE, OPENALLES = range(12)
+BIDS = tuple(range(PASS, OPENALLES + 1))
+RIK_BIDS = (RIK, RIKp1, RIKp2, RIKp3, RIKp4, RIKp5)
+MISERIE_BIDS = (MISERIE, OPENMISERIEKAART, OPENMISERIE)
+VOORALLES_BIDS = (OPENALLESKAART, OPENALLES)
+TRICKS_REQUIRED = {RIK: 8, RIKp1: 9, RIKp2: 10, RIKp3: 11, RIKp4: 12, RIKp5: 13}
+POINTS = {MISERIE: 9, OPENMISERIEKAART: 12, OPENALLESKAART: 15, OPENMISERIE: 18, OPENALLES: 21}
+
+# Round phases
+BIDDING_PHASE, FINALIZE_BIDDING_PHASE, TRICK_TAKING_PHASE, END_OF_ROUND_PHASE = 0, 1, 2, 3
+
+
+class GameException(Exception):
+    pass
+
+class BadBidException(Exception):
+    pass
+
+class IllegalChoiceException(Exception):
+    pass
+
+class BadPlayException(Exception):
+    pass
+
+
+def card(suit, number):
+    """
+    Returns the index of the card with the given suit and number. Within a suit
+    the index increases with the worth of the card, so the ace has the highest
+    index of its suit.
+
+    """
+    return suit * 13 + worth(number) - 1
+
+def card_suit(card):
+    return card // 13
+
+def card_number(card):
+    rank = card % 13
+    if rank == 12:
+        return 1
+    return rank + 2
+
+def card_worth(card):
+    return card % 13 + 1
+
+def worth(number):
+    if number == 1:
+        return 13
+    return number - 1
+
+
+def is_rik(bid):
+    return bid in RIK_BIDS
+
+def is_miserie(bid):
+    return bid in MISERIE_BIDS
+
+def is_vooralles(bid):
+    return bid in VOORALLES_BIDS
+
+def tricks_needed_to_win(bid):
+    if is_rik(bid):
+        return TRICKS_REQUIRED[bid]
+    elif is_vooralles(bid):
+        return TRICKS_PER_ROUND
+    # This is not applicable for Miserie
+    return None
+
+def points_to_earn(bid):
+    if is_rik(bid):
+        # This depends on the game
+        return None
+    return POINTS[bid]
+
+def trump_suit_needed(bid):
+    return not is_miserie(bid)
+
+def mate_card_needed(bid):
+    return is_rik(bid)
+
+
+# The seats in turn order starting from every seat
+TURN_ORDER = tuple(tuple((start + offset) % PLAYERS for offset in range(PLAYERS)) for start in range(PLAYERS))
+# The position of every seat as seen from every seat: 0 for the seat itself, 1 for the next seat and so on
+RELATIVE_SEATS = tuple(tuple((seat - viewer) % PLAYERS for seat in range(PLAYERS)) for viewer in range(PLAYERS))
+NEXT_SEATS = tuple(order[1] for order in TURN_ORDER)
+
+def next_seat(seat):
+    return NEXT_SEATS[seat]
+
+def turn_order(start):
+    """
+    Returns the seats in the order they take turns, starting with the given
+    seat
+
+    """
+    return TURN_ORDER[start]
+
+def relative_seat(viewer, seat):
+    """
+    Returns the position of the given seat at the table as seen from the
+    seat of the viewer, counting in turn order
+
+    """
+    return RELATIVE_SEATS[viewer][seat]
+
+def dealer_for_round(round_number):
+    """
+    Returns the seat of the dealer of the given round (the first round is 1)
+
+    """
+    return (round_number - 1) % PLAYERS
+
+def deal(deck):
+    """
+    Distribute the given deck (a list of cards, the top card first) between the
+    players. Returns the hand for every seat.
+
+    """
+    if len(deck) != DECK_SIZE:
+        raise GameException('Trying to deal with less than {} cards in the deck'.format(DECK_SIZE))
+
+    hands = [cardset.EMPTY] * PLAYERS
+    next_card_to_deal = 0
+    for deal_amount in DEAL_ORDER:
+        for seat in range(PLAYERS):
+            hands[seat] |= cardset.from_cards(deck[next_card_to_deal:next_card_to_deal + deal_amount])
+            next_card_to_deal += deal_amount
+    return hands
+
+
+class TrickState(object):
+    """
+    A trick of a round: the seat that leads it and the cards played in it
+
+    """
+    __slots__ = ('leader', 'plays', 'cards', 'collected')
+
+    def __init__(self, leader):
+        self.leader = leader
+        # A list of (seat, card) tuples in the order the cards were played
+        self.plays = []
+        self.cards = cardset.EMPTY
+        self.collected = False
+
+    @property
+    def requested_suit(self):
+        if not self.plays:
+            return None
+        return card_suit(self.plays[0][1])
+
+    def is_done(self):
+        return len(self.plays) >= PLAYERS
+
+    def copy(self):
+        trick = TrickState(self.leader)
+        trick.plays = list(self.plays)
+        trick.cards = self.cards
+        trick.collected = self.collected
+        return trick
+
+
+class RoundState(object):
+    """
+    Everything that happens in a single round: the hands of the players, the
+    bidding, the finalized bid and the tricks
+
+    """
+    __slots__ = ('dealer', 'hands', 'played', 'bids', 'to_bid', 'passed', 'high', 'bidder', 'bid', 'trump_suit', 'mate_suit',
+                 'mate_card', 'mate', 'tricks', 'collected', 'won')
+
+    def __init__(self, dealer, hands):
+        self.dealer = dealer
+        # The card set in the hand of every seat
+        self.hands = hands
+        # The card set of every card played this round
+        self.played = cardset.EMPTY
+        # A list of (seat, bid) tuples in the order the bids were placed
+        self.bids = []
+        # The bidding so far: the seat to bid next, the seats that passed as a bit mask and the highest
+        # (seat, bid) placed
+        self.to_bid = next_seat(dealer)
+        self.passed = 0
+        self.high = None
+        # The seat and bid that won the bidding, None while bidding
+        self.bidder = None
+        self.bid = None
+        self.trump_suit = None
+        self.mate_suit = None
+        self.mate_card = None
+        self.mate = None
+        self.tricks = []
+        # Running counts of the collected tricks, in total and per seat
+        self.collected = 0
+        self.won = [0] * PLAYERS
+
+    def copy(self):
+        """
+        Returns a copy of this round that can be played on without changing
+        this one
+
+        """
+        round_state = RoundState.__new__(RoundState)
+        for slot in RoundState.__slots__:
+            setattr(round_state, slot, getattr(self, slot))
+        round_state.hands = list(self.hands)
+        round_state.bids = list(self.bids)
+        round_state.won = list(self.won)
+        # Only the last trick can still change
+        round_state.tricks = self.tricks[:-1] + [trick.copy() for trick in self.tricks[-1:]]
+        return round_state
+
+
+class GameState(object):
+    """
+    The scores of the players, the round that is being played and the seats
+    of the players that left the game
+
+    """
+    __slots__ = ('scores', 'round_number', 'round', 'abandoned')
+
+    def __init__(self, scores=None, round_number=0, round=None):
+        self.scores = list(scores) if scores is not None else [100] * PLAYERS
+        self.round_number = round_number
+        self.round = round
+        self.abandoned = []
+
+    def copy(self):
+        game_state = GameState(self.scores, self.round_number, self.round.copy() if self.round is not None else None)
+        game_state.abandoned = list(self.abandoned)
+        return game_state
+
+
+def new_round(game_state, deck):
+    """
+    Deal the given deck and start the next round of the game
+
+    """
+    if game_state.round is not None and current_phase(game_state.round) is not END_OF_ROUND_PHASE:
+        raise GameException('Trying to start a round while the current round is underway')
+    game_state.round_number += 1
+    game_state.round = RoundState(dealer_for_round(game_state.round_number), deal(deck))
+    return game_state.round
+
+def settle_round(game_state):
+    """
+    Add the points earned in the finished round to the scores of the players
+
+    """
+    round_state = game_state.round
+    if round_state is None or not is_finished(round_state):
+        raise GameException('Trying to settle a round that is not finished')
+    points = round_points(round_state)
+    for seat in range(PLAYERS):
+        game_state.scores[seat] += points[seat]
+    game_state.round = None
+    return points
+
+
+def current_phase(round_state):
+    if round_state.bid is None:
+        return BIDDING_PHASE
+    elif not bid_is_complete(round_state):
+        return FINALIZE_BIDDING_PHASE
+    elif not is_finished(round_state):
+        return TRICK_TAKING_PHASE
+    return END_OF_ROUND_PHASE
+
+def bid_is_complete(round_state):
+    if round_state.bid is None:
+        return False
+    if trump_suit_needed(round_state.bid) and round_state.trump_suit is None:
+        return False
+    if mate_card_needed(round_state.bid) and round_state.mate_card is None:
+        return False
+    return True
+
+
+def highest_bid(round_state):
+    """
+    Returns the (seat, bid) tuple of the highest bid placed so far, None if
+    every player passed
+
+    """
+    return round_state.high
+
+def passes(round_state):
+    return bin(round_state.passed).count('1')
+
+def next_bidder(round_state):
+    """
+    Returns the seat of the player that should bid next, None if the bidding
+    is done
+
+    """
+    if round_state.bid is not None:
+        return None
+    return round_state.to_bid
+
+def advance_bidding(round_state, seat, bid):
+    """
+    Move the bidding on after the given seat placed the given bid. The turn
+    goes around the table, skipping the players that passed, until everybody
+    but 1 player has passed and every player has bid at least once.
+
+    """
+    if bid == PASS:
+        round_state.passed |= 1 << seat
+    else:
+        round_state.high = (seat, bid)
+
+    if passes(round_state) >= PLAYERS - 1 and len(round_state.bids) >= PLAYERS:
+        round_state.to_bid = None
+        return
+
+    seat = next_seat(seat)
+    while round_state.passed & (1 << seat):
+        seat = next_seat(seat)
+    round_state.to_bid = seat
+
+def check_bid(round_state, seat, bid):
+    """
+    Raise an exception if the given seat may not place the given bid now
+
+    """
+    if current_phase(round_state) is not BIDDING_PHASE:
+        raise GameException('Seat {} trying to place bid in phase {}'.format(seat, current_phase(round_state)))
+    if seat != next_bidder(round_state):
+        raise GameException('Seat {} trying to bid while it is seat {}\'s turn to bid'.format(seat, next_bidder(round_state)))
+    if bid != PASS and bid not in TRICKS_REQUIRED and bid not in POINTS:
+        raise GameException('Seat {} trying to place an unknown bid: {}'.format(seat, bid))
+
+    current_highest_bid = highest_bid(round_state)
+    if bid == PASS:
+        # Make sure this is not the last player passing when everyone else has passed
+        if current_highest_bid is None and passes(round_state) >= PLAYERS - 1:
+            raise BadBidException('You are the last player to bid and every other player has passed. You must place a bid.')
+    elif current_highest_bid is not None and bid <= current_highest_bid[1]:
+        raise BadBidException('Please bid higher than the currently placed bid.')
+
+def legal_bids(round_state, seat):
+    """
+    Returns the bids the given seat can choose from now, lowest first, none
+    when it is not his turn to bid: a pass, unless every other player passed
+    already, and the bids above the highest bid, where a rik is only raised
+    to the next rik
+
+    """
+    if current_phase(round_state) is not BIDDING_PHASE or next_bidder(round_state) != seat:
+        return []
+
+    current_highest_bid = highest_bid(round_state)
+    bids = []
+    if current_highest_bid is not None or passes(round_state) < PLAYERS - 1:
+        bids.append(PASS)
+
+    rik_offered = False
+    for bid in BIDS[current_highest_bid[1] + 1 if current_highest_bid is not None else RIK:]:
+        if is_rik(bid):
+            if rik_offered:
+                continue
+            rik_offered = True
+        bids.append(bid)
+    return bids
+
+def place_bid(round_state, seat, bid):
+    check_bid(round_state, seat, bid)
+    round_state.bids.append((seat, bid))
+    advance_bidding(round_state, seat, bid)
+
+    if next_bidder(round_state) is None:
+        # Bidding is done, set the highest bid
+        round_state.bidder, round_state.bid = highest_bid(round_state)
+        open_trick(round_state)
+
+def pick_mate_card(hand, trump_suit, mate_suit):
+    """
+    Returns the mate card in the given suit for a player with the given hand.
+    This is the ace, unless the player holds the ace of every suit but the
+    trump suit, in which case it's the king and so on.
+
+    """
+    for rank in range(12, -1, -1):
+        mate_card = mate_suit * 13 + rank
+        if not cardset.contains(hand, mate_card):
+            # The player does not have this card of the chosen mate suit, this is an ok choice
+            return mate_card
+
+        # The player has the highest card of the asked mate suit. This is only allowed if he has all of
+        # the highest cards except that of the trump suit
+        needed = cardset.RANK_MASKS[rank] & ~cardset.SUIT_MASKS[trump_suit]
+        if hand & needed != needed:
+            # The player has the option of picking another mate suit, it follows that this mate suit is an illegal
+            # choice
+            raise IllegalChoiceException('You must pick another mate suit. You have the highest card of the chosen mate suit and there are other options.')
+    raise GameException('Player has every card of the mate suit {}'.format(mate_suit))
+
+def legal_finalizations(round_state, seat):
+    """
+    Returns every (trump suit, mate suit, mate card) the given seat can
+    finalize his bid with now, none when he does not have to finalize a bid.
+    The mate suit and card are None for bids without a mate.
+
+    """
+    if current_phase(round_state) is not FINALIZE_BIDDING_PHASE or seat != round_state.bidder:
+        return []
+    if not mate_card_needed(round_state.bid):
+        return [(trump_suit, None, None) for trump_suit in SUITS]
+
+    hand = round_state.hands[seat]
+    finalizations = []
+    for trump_suit in SUITS:
+        for mate_suit in SUITS:
+            if mate_suit == trump_suit:
+                continue
+            try:
+                finalizations.append((trump_suit, mate_suit, pick_mate_card(hand, trump_suit, mate_suit)))
+            except (IllegalChoiceException, GameException):
+                pass
+    return finalizations
+
+def finalize_bid(round_state, seat, trump_suit=None, mate_suit=None):
+    if current_phase(round_state) is not FINALIZE_BIDDING_PHASE:
+        raise GameException('Seat {} trying to finalize bid during phase {}'.format(seat, current_phase(round_state)))
+    if seat != round_state.bidder:
+        raise GameException('Seat {} trying to finalize bid while seat {} has the highest bid'.format(seat, round_state.bidder))
+
+    if trump_suit is None:
+        raise IllegalChoiceException('You must choose a trump suit')
+
+    if mate_card_needed(round_state.bid):
+        if mate_suit is None:
+            raise IllegalChoiceException('You must choose a mate card')
+        elif trump_suit == mate_suit:
+            raise IllegalChoiceException('You cannot pick the trump suit as mate.')
+
+        mate_card = pick_mate_card(round_state.hands[seat], trump_suit, mate_suit)
+        round_state.mate_suit = mate_suit
+        round_state.mate_card = mate_card
+        round_state.mate = owner(round_state, mate_card)
+
+    round_state.trump_suit = trump_suit
+    open_trick(round_state)
+
+def owner(round_state, card):
+    """
+    Returns the seat of the player holding the given card, None if it has
+    been played already
+
+    """
+    for seat in range(PLAYERS):
+        if cardset.contains(round_state.hands[seat], card):
+            return seat
+    return None
+
+
+def current_trick(round_state):
+    if not round_state.tricks:
+        return None
+    return round_state.tricks[-1]
+
+def previous_trick(round_state):
+    if len(round_state.tricks) < 2:
+        return None
+    return round_state.tricks[-2]
+
+def open_trick(round_state):
+    """
+    Start a new trick if the previous one is collected and the round is not
+    finished yet
+
+    """
+    if current_phase(round_state) is not TRICK_TAKING_PHASE:
+        return
+    if round_state.tricks and not round_state.tricks[-1].collected:
+        return
+    if round_state.tricks:
+        leader = trick_winner(round_state, round_state.tricks[-1])
+    else:
+        leader = next_seat(round_state.dealer)
+    round_state.tricks.append(TrickState(leader))
+
+def next_to_play(trick_state):
+    """
+    Returns the seat of the player that should play next in the given trick,
+    None if every player has played a card
+
+    """
+    if trick_state.is_done():
+        return None
+    return TURN_ORDER[trick_state.leader][len(trick_state.plays)]
+
+def trick_winner(round_state, trick_state):
+    if not trick_state.is_done():
+        return None
+
+    winning_card = None
+    if round_state.trump_suit is not None:
+        winning_card = cardset.highest_in_suit(trick_state.cards, round_state.trump_suit)
+    if winning_card is None:
+        winning_card = cardset.highest_in_suit(trick_state.cards, trick_state.requested_suit)
+    for seat, played in trick_state.plays:
+        if played == winning_card:
+            return seat
+
+def check_play(round_state, seat, card):
+    """
+    Raise an exception if the given seat may not play the given card now
+
+    """
+    if current_phase(round_state) is not TRICK_TAKING_PHASE:
+        raise GameException('Seat {} trying to play card in phase {}'.format(seat, current_phase(round_state)))
+    trick = current_trick(round_state)
+    if trick.is_done():
+        raise GameException('Seat {} trying to play card in a trick that is done'.format(seat))
+    if next_to_play(trick) != seat:
+        raise GameException('Seat {} trying to play card while seat {} is next in line'.format(seat, next_to_play(trick)))
+
+    hand = round_state.hands[seat]
+    if not cardset.contains(hand, card):
+        raise GameException('Seat {} trying to play card {}, but he does not have it in his hand'.format(seat, card))
+
+    requested_suit = trick.requested_suit
+    if requested_suit is not None:
+        if card_suit(card) != requested_suit:
+            # Check if the player does not have any cards of the requested suit left
+            if cardset.has_suit(hand, requested_suit):
+                raise BadPlayException("You must follow suit if possible.")
+        elif seat == round_state.mate and trick.leader == round_state.bidder and requested_suit == round_state.mate_suit:
+            # The leading player has requested the mate card
+            if cardset.contains(hand, round_state.mate_card) and card != round_state.mate_card:
+                # Mate must play the mate card
+                raise BadPlayException("You must play the mate card if requested by the leading player.")
+
+def legal_plays(round_state, seat):
+    """
+    Returns the set of cards the given seat may play now, which is empty when
+    it is not his turn to play
+
+    """
+    if current_phase(round_state) is not TRICK_TAKING_PHASE:
+        return cardset.EMPTY
+    trick = current_trick(round_state)
+    if trick.is_done() or next_to_play(trick) != seat:
+        return cardset.EMPTY
+
+    hand = round_state.hands[seat]
+    requested_suit = trick.requested_suit
+    if requested_suit is None:
+        return hand
+    following = cardset.in_suit(hand, requested_suit)
+    if not following:
+        return hand
+    if seat == round_state.mate and trick.leader == round_state.bidder and requested_suit == round_state.mate_suit \
+     and cardset.contains(hand, round_state.mate_card):
+        return cardset.bit(round_state.mate_card)
+    return following
+
+def play_card(round_state, seat, card):
+    check_play(round_state, seat, card)
+
+    trick = current_trick(round_state)
+    card_bit = cardset.bit(card)
+    round_state.hands[seat] &= ~card_bit
+    round_state.played |= card_bit
+    trick.plays.append((seat, card))
+    trick.cards |= card_bit
+
+def collect(round_state, seat):
+    trick = current_trick(round_state)
+    if trick is None or trick.collected or not trick.is_done():
+        raise GameException('Seat {} trying to collect a trick that is not done'.format(seat))
+    if trick_winner(round_state, trick) != seat:
+        raise GameException('Seat {} trying to collect a trick he did not win'.format(seat))
+
+    trick.collected = True
+    round_state.collected += 1
+    round_state.won[seat] += 1
+    open_trick(round_state)
+
+def recount(round_state):
+    """
+    Recompute the bidding and the running trick counts of the given round
+    from its bids and tricks, after these were restored from storage
+
+    """
+    bids, round_state.bids = round_state.bids, []
+    round_state.to_bid, round_state.passed, round_state.high = next_seat(round_state.dealer), 0, None
+    for seat, bid in bids:
+        round_state.bids.append((seat, bid))
+        advance_bidding(round_state, seat, bid)
+
+    round_state.collected = 0
+    round_state.won = [0] * PLAYERS
+    for trick in round_state.tricks:
+        if trick.collected:
+            round_state.collected += 1
+            round_state.won[trick_winner(round_state, trick)] += 1
+
+def mate_card_played(round_state):
+    if round_state.mate_card is None:
+        return False
+    return cardset.contains(round_state.played, round_state.mate_card)
+
+
+def tricks_collected(round_state):
+    return round_state.collected
+
+def tricks_won(round_state, seat):
+    """
+    Returns the amount of finished tricks won by the given seat
+
+    """
+    won = round_state.won[seat]
+    trick = current_trick(round_state)
+    if trick is not None and not trick.collected and trick_winner(round_state, trick) == seat:
+        won += 1
+    return won
+
+def in_asking_team(round_state, seat):
+    return seat == round_state.bidder or (round_state.mate is not None and seat == round_state.mate)
+
+def asking_team_tricks(round_state):
+    """
+    Returns the amount of tricks currently won by the asking team
+
+    """
+    if round_state.bidder is None:
+        return 0
+    tricks = round_state.won[round_state.bidder]
+    if round_state.mate is not None and round_state.mate != round_state.bidder:
+        tricks += round_state.won[round_state.mate]
+    return tricks
+
+def asking_team_won(round_state):
+    """
+    Returns wether the asking team won this round, None as long as that is
+    not decided
+
+    """
+    if round_state.bid is None:
+        return None
+
+    tricks_won = asking_team_tricks(round_state)
+    tricks_played = tricks_collected(round_state)
+
+    if is_rik(round_state.bid):
+        if tricks_played < TRICKS_PER_ROUND:
+            return None
+        return tricks_won >= tricks_needed_to_win(round_state.bid)
+
+    elif is_miserie(round_state.bid):
+        if tricks_won > 0:
+            return False
+        elif tricks_played >= TRICKS_PER_ROUND:
+            return True
+        return None
+
+    elif is_vooralles(round_state.bid):
+        if tricks_won < tricks_played:
+            return False
+        elif tricks_played >= TRICKS_PER_ROUND:
+            return True
+        return None
+
+    raise GameException('Unknown Bid')
+
+def is_finished(round_state):
+    return asking_team_won(round_state) is not None
+
+def asking_team_points(round_state):
+    """
+    Returns the points for the asking team at the end of the round (can be
+    negative)
+
+    """
+    if not is_finished(round_state):
+        raise GameException('Round is not yet finished')
+
+    if is_rik(round_state.bid):
+        tricks_won = asking_team_tricks(round_state)
+        tricks_needed = tricks_needed_to_win(round_state.bid)
+
+        if tricks_won >= tricks_needed:
+            return tricks_won - tricks_needed + 1
+        return tricks_won - tricks_needed - 1
+
+    if asking_team_won(round_state):
+        return points_to_earn(round_state.bid)
+    return -points_to_earn(round_state.bid)
+
+def other_player_points(round_state):
+    if is_rik(round_state.bid):
+        return -asking_team_points(round_state)
+    return -asking_team_points(round_state) // (PLAYERS - 1)
+
+def points_earned(round_state, seat):
+    if in_asking_team(round_state, seat):
+        return asking_team_points(round_state)
+    return other_player_points(round_state)
+
+def round_points(round_state):
+    """
+    Returns the points earned by every seat in the finished round, working
+    out the points of both teams only once
+
+    """
+    asking_points = asking_team_points(round_state)
+    if is_rik(round_state.bid):
+        other_points = -asking_points
+    else:
+        other_points = -asking_points // (PLAYERS - 1)
+    return [asking_points if in_asking_team(round_state, seat) else other_points for seat in range(PLAYERS)]
+
+def returned_cards(round_state):
+    """
+    Returns the cards of the round in the order they go back on the deck:
+    the played tricks from the last one to the first with the last played
+    card on top, followed by the cards still in the hands
+
+    """
+    cards = []
+    for trick in reversed(round_state.tricks):
+        cards.extend(card for seat, card in reversed(trick.plays))
+    for hand in round_state.hands:
+        cards.extend(cardset.cards(hand))
+    return cards
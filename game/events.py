@@ -0,0 +1,117 @@
+"""
+The actions taken in a game as an append-only list of events.
+
+Replaying the events of a game on top of the latest snapshot of its engine
+state rebuilds the current state of the game. The events and snapshots are
+stored by the GameEvent and GameSnapshot models, this module only applies and
+encodes them.
+
+For now the actions write their events next to the Bid, Trick, PlayedInTrick
+and IsPlaying rows, which the pages and the model helpers still read. The
+engine state of the current round already comes from the log. Once nothing
+reads those rows any more, the actions stop writing them and an action is a
+single insert into the log.
+
+"""
+import json
+
+from game import engine, cardset
+
+# Event kinds
+DEAL, BID, FINALIZE, PLAY, COLLECT, ABANDON = 0, 1, 2, 3, 4, 5
+KINDS = ((DEAL, 'Deal'), (BID, 'Bid'), (FINALIZE, 'Finalize'), (PLAY, 'Play'), (COLLECT, 'Collect'), (ABANDON, 'Abandon'))
+
+# A snapshot is taken every SNAPSHOT_INTERVAL events
+SNAPSHOT_INTERVAL = 32
+
+
+def apply(game_state, kind, seat, data):
+    """
+    Apply a single event to the given engine state. The data of an event is:
+    the dealt deck for DEAL, the bid for BID, the trump suit and mate suit for
+    FINALIZE and the card for PLAY.
+
+    """
+    round_state = game_state.round
+
+    if kind == DEAL:
+        if round_state is not None:
+            engine.settle_round(game_state)
+        engine.new_round(game_state, data)
+    elif kind == BID:
+        engine.place_bid(round_state, seat, data)
+    elif kind == FINALIZE:
+        engine.finalize_bid(round_state, seat, data[0], data[1])
+    elif kind == PLAY:
+        engine.play_card(round_state, seat, data)
+    elif kind == COLLECT:
+        engine.collect(round_state, seat)
+    elif kind == ABANDON:
+        if seat not in game_state.abandoned:
+            game_state.abandoned.append(seat)
+    else:
+        raise engine.GameException('Unknown event: {}'.format(kind))
+
+def replay(game_state, events):
+    """
+    Apply the given (kind, seat, data) events in order
+
+    """
+    for kind, seat, data in events:
+        apply(game_state, kind, seat, data)
+    return game_state
+
+
+def encode_data(data):
+    return json.dumps(data, separators=(',', ':'))
+
+def decode_data(encoded):
+    return json.loads(encoded)
+
+
+def encode_state(game_state):
+    """
+    Returns the given engine state as a compact string
+
+    """
+    round_state = game_state.round
+    if round_state is None:
+        encoded_round = None
+    else:
+        bids = []
+        for seat, bid in round_state.bids:
+            bids.extend((seat, bid))
+        tricks = []
+        for trick in round_state.tricks:
+            encoded_trick = [trick.leader, int(trick.collected)]
+            for seat, card in trick.plays:
+                encoded_trick.extend((seat, card))
+            tricks.append(encoded_trick)
+        encoded_round = [round_state.dealer, round_state.hands, bids, round_state.bidder, round_state.bid,
+                         round_state.trump_suit, round_state.mate_suit, round_state.mate_card, round_state.mate, tricks]
+
+    return encode_data([game_state.scores, game_state.round_number, game_state.abandoned, encoded_round])
+
+def decode_state(encoded):
+    scores, round_number, abandoned, encoded_round = decode_data(encoded)
+    game_state = engine.GameState(scores, round_number)
+    game_state.abandoned = abandoned
+
+    if encoded_round is not None:
+        dealer, hands, bids, bidder, bid, trump_suit, mate_suit, mate_card, mate, tricks = encoded_round
+        round_state = engine.RoundState(dealer, hands)
+        round_state.bids = list(zip(bids[::2], bids[1::2]))
+        round_state.bidder, round_state.bid = bidder, bid
+        round_state.trump_suit, round_state.mate_suit, round_state.mate_card, round_state.mate = trump_suit, mate_suit, mate_card, mate
+        for encoded_trick in tricks:
+            trick = engine.TrickState(encoded_trick[0])
+            trick.collected = bool(encoded_trick[1])
+            trick.plays = list(zip(encoded_trick[2::2], encoded_trick[3::2]))
+            for seat, card in trick.plays:
+                trick.cards |= cardset.bit(card)
+            round_state.played |= trick.cards
+            round_state.tricks.append(trick)
+        engine.recount(round_state)
+        game_state.round = round_state
+
+    return game_state
@@ -1,5 +1,5 @@
 from django import forms
-from game.models import Bid
+from game.models import Bid, Card
 
 class MakeBidForm(forms.ModelForm):
     class Meta:
@@ -7,41 +7,40 @@ class MakeBidForm(forms.ModelForm):
         fields = ['bid']
         
     def __init__(self, *args, **kwargs):
-        current_round = kwargs.get('current_round', None)
-        if 'current_round' in kwargs:
-            del kwargs['current_round']
-            
+        current_round = kwargs.pop('current_round', None)
+        player = kwargs.pop('player', None)
+        
         result = super(MakeBidForm, self).__init__(*args, **kwargs)
         
-        if current_round is not None:
-            highest_bid = current_round.temp_highest_bid()
-            if highest_bid is None:
-                highest_bid = -1
-            else:
-                highest_bid = highest_bid.bid
-            
-            choices = []
-            lowest_rik = False
-            for bid in Bid.BIDS:
-                if bid[0] is Bid.PASS:
-                    choices.append(bid)
-                elif bid[0] > highest_bid:
-                    if Bid.bid_is_rik(bid[0]):
-                        if not lowest_rik:
-                            choices.append(bid)
-                            lowest_rik = True
-                    else:
-                        choices.append(bid)
-                
-            self.fields['bid'].choices = choices
+        if current_round is not None and player is not None:
+            names = dict(Bid.BIDS)
+            self.fields['bid'].choices = [(bid, names[bid]) for bid in current_round.legal_bids(player)]
+        return result
+
+class FinalizeBidForm(forms.ModelForm):
+    """
+    Offers only the suits that are part of a legal finalization when the
+    legal finalizations are given
+    
+    """
+    def __init__(self, *args, **kwargs):
+        finalizations = kwargs.pop('finalizations', None)
+        
+        result = super(FinalizeBidForm, self).__init__(*args, **kwargs)
+        
+        if finalizations is not None:
+            for field, position in (('trump_suit', 0), ('mate_suit', 1)):
+                if field in self.fields:
+                    suits = set(finalization[position] for finalization in finalizations)
+                    self.fields[field].choices = [(suit, name) for suit, name in Card.SUITS if suit in suits]
         return result
 
-class PickTrumpSuitAndMateForm(forms.ModelForm):
+class PickTrumpSuitAndMateForm(FinalizeBidForm):
     class Meta:
         model = Bid
         fields = ['trump_suit', 'mate_suit']
 
-class PickTrumpSuitForm(forms.ModelForm):
+class PickTrumpSuitForm(FinalizeBidForm):
     class Meta:
         model = Bid
-        fields = ['trump_suit']
\ No newline at end of file
+        fields = ['trump_suit']
@@ -0,0 +1,90 @@
+"""
+Locks that serialize the actions taken in a single game.
+
+Every game gets its own reentrant lock, so actions in unrelated games never
+wait on each other. The registry only remembers a limited amount of locks:
+when it grows too big, the locks of the games that have been idle the longest
+and that nobody is holding or waiting for are forgotten.
+
+"""
+from collections import OrderedDict
+import threading
+
+
+class _Entry(object):
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # The amount of threads holding or waiting for this lock
+        self.users = 0
+
+
+class _Hold(object):
+    """
+    Context manager holding the lock of a game
+
+    """
+    __slots__ = ('registry', 'key', 'entry')
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+        self.entry = None
+
+    def __enter__(self):
+        self.entry = self.registry._checkout(self.key)
+        self.entry.lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.entry.lock.release()
+        self.registry._checkin(self.entry)
+        self.entry = None
+
+
+class LockRegistry(object):
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hold(self, key):
+        """
+        Returns a context manager holding the lock for the given key, e.g.:
+
+            with game_locks.hold(game.id):
+                ...
+
+        """
+        return _Hold(self, key)
+
+    def _checkout(self, key):
+        with self._mutex:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = _Entry()
+            # The most recently used locks are kept at the end
+            self._entries[key] = entry
+            entry.users += 1
+            if len(self._entries) > self.max_size:
+                self._evict()
+            return entry
+
+    def _checkin(self, entry):
+        with self._mutex:
+            entry.users -= 1
+
+    def _evict(self):
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_size:
+                return
+            if self._entries[key].users <= 0:
+                del self._entries[key]
+
+
+game_locks = LockRegistry()
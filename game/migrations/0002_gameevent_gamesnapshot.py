@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sequence', models.PositiveIntegerField()),
+                ('kind', models.PositiveSmallIntegerField(choices=[(0, b'Deal'), (1, b'Bid'), (2, b'Finalize'), (3, b'Play'), (4, b'Collect'), (5, b'Abandon')])),
+                ('seat', models.PositiveSmallIntegerField(null=True, blank=True)),
+                ('data', models.TextField(blank=True)),
+                ('game', models.ForeignKey(related_name=b'events', to='game.Game')),
+            ],
+            options={
+                'ordering': ('sequence',),
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='GameSnapshot',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('sequence', models.PositiveIntegerField()),
+                ('data', models.TextField()),
+                ('game', models.ForeignKey(related_name=b'snapshots', to='game.Game')),
+            ],
+            options={
+                'ordering': ('sequence',),
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gamesnapshot',
+            unique_together=set([('game', 'sequence')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gameevent',
+            unique_together=set([('game', 'sequence')]),
+        ),
+        migrations.AlterModelOptions(
+            name='card',
+            options={'ordering': ('suit', 'number')},
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_game_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='collected_tricks',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='phase',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='team_tricks',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+    ]
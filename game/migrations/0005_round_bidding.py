@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_round_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='round',
+            name='high_bid',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='high_bidder',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='next_bidder',
+            field=models.PositiveSmallIntegerField(null=True, blank=True),
+            preserve_default=True,
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='passed_seats',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=True,
+        ),
+    ]
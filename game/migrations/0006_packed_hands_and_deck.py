@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from game import engine, cardset
+
+
+def pack_hands_and_decks(apps, schema_editor):
+    Game = apps.get_model('game', 'Game')
+    IsPlaying = apps.get_model('game', 'IsPlaying')
+    CardInHand = apps.get_model('game', 'CardInHand')
+    IsInDeck = apps.get_model('game', 'IsInDeck')
+
+    hands = {}
+    for isplaying_id, suit, number in CardInHand.objects.values_list('isplaying_id', 'card__suit', 'card__number'):
+        hands[isplaying_id] = hands.get(isplaying_id, cardset.EMPTY) | cardset.bit(engine.card(suit, number))
+    for isplaying_id, hand in hands.items():
+        IsPlaying.objects.filter(id=isplaying_id).update(hand=hand)
+
+    decks = {}
+    for game_id, suit, number in IsInDeck.objects.order_by('ordinal').values_list('game_id', 'card__suit', 'card__number'):
+        decks.setdefault(game_id, bytearray()).append(engine.card(suit, number))
+    for game_id, deck in decks.items():
+        Game.objects.filter(id=game_id).update(deck=bytes(deck))
+
+def unpack_hands_and_decks(apps, schema_editor):
+    Card = apps.get_model('game', 'Card')
+    IsPlaying = apps.get_model('game', 'IsPlaying')
+    Game = apps.get_model('game', 'Game')
+    CardInHand = apps.get_model('game', 'CardInHand')
+    IsInDeck = apps.get_model('game', 'IsInDeck')
+
+    cards = dict((engine.card(card.suit, card.number), card) for card in Card.objects.all())
+    CardInHand.objects.bulk_create([CardInHand(isplaying_id=isplaying_id, card=cards[card])
+                                    for isplaying_id, hand in IsPlaying.objects.values_list('id', 'hand')
+                                    for card in cardset.cards(hand)])
+    IsInDeck.objects.bulk_create([IsInDeck(game_id=game_id, card=cards[card], ordinal=ordinal)
+                                  for game_id, deck in Game.objects.values_list('id', 'deck')
+                                  for ordinal, card in enumerate(bytearray(deck or b''))])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_round_bidding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='isplaying',
+            name='hand',
+            field=models.BigIntegerField(default=0),
+            preserve_default=True,
+        ),
+        migrations.RemoveField(
+            model_name='game',
+            name='deck',
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='deck',
+            field=models.BinaryField(default=b''),
+            preserve_default=True,
+        ),
+        migrations.RunPython(pack_hands_and_decks, unpack_hands_and_decks),
+        migrations.RemoveField(
+            model_name='isplaying',
+            name='cards',
+        ),
+        migrations.DeleteModel(
+            name='CardInHand',
+        ),
+        migrations.DeleteModel(
+            name='IsInDeck',
+        ),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+def count_events(apps, schema_editor):
+    Game = apps.get_model('game', 'Game')
+    GameEvent = apps.get_model('game', 'GameEvent')
+
+    for game_id, last in GameEvent.objects.values_list('game_id').annotate(last=models.Max('sequence')):
+        Game.objects.filter(id=game_id).update(event_sequence=last)
+
+def forget_event_count(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_packed_hands_and_deck'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='event_sequence',
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=True,
+        ),
+        migrations.RunPython(count_events, forget_event_count),
+    ]
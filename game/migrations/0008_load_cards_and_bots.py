@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+from django.core.management import call_command
+
+
+# 0001 loads initial_data.json, which used to hold the cards and the bots. Django 1.7 also loads any
+# initial_data fixture by itself when it flushes a database, before the tables of the migrated apps
+# exist, so that fixture is left empty and the cards and bots are loaded here instead.
+def load_cards_and_bots(apps, schema_editor):
+    call_command('loaddata', 'cards_and_bots.json')
+
+def keep_cards_and_bots(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0007_game_event_sequence'),
+    ]
+
+    operations = [
+        migrations.RunPython(load_cards_and_bots, keep_cards_and_bots),
+    ]
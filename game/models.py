@@ -1,36 +1,93 @@
-from django.db import models
+import random
+import threading
+
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from portal import bidding_needed, playing_needed, collection_needed
-import threading
 from django.conf import settings
-
-global_lock = threading.RLock()
-
-class GameException(Exception):
-    pass
+from game import engine, cardset, events
+from game.engine import GameException
+from game.locks import game_locks
+from game.updates import game_updates
+from game.push import game_push
+from game.seating import Seating
+from game.changes import game_changes
 
 class CardManager(models.Manager):
+    """
+    The cards never change, so they are loaded from the database once and
+    looked up in memory afterwards
+    
+    """
+    _lock = threading.Lock()
+    _by_index = None
+    _by_pk = None
+    
+    def _registry(self):
+        if CardManager._by_index is None:
+            with CardManager._lock:
+                if CardManager._by_index is None:
+                    by_index = [None] * engine.DECK_SIZE
+                    for card in self.get_queryset():
+                        by_index[card.index()] = card
+                    CardManager._by_pk = dict((card.pk, card) for card in by_index)
+                    CardManager._by_index = tuple(by_index)
+        return CardManager._by_index
+    
+    def all_cards(self):
+        """
+        Returns all cards, ordered by their index in the game engine
+        
+        """
+        return self._registry()
+    
+    def get_by_index(self, index):
+        try:
+            return self._registry()[index]
+        except (IndexError, TypeError):
+            raise self.model.DoesNotExist('No card with index {}'.format(index))
+    
+    def get_by_suit_and_number(self, suit, number):
+        if suit not in engine.SUITS or not 1 <= number <= 13:
+            raise self.model.DoesNotExist('No card with suit {} and number {}'.format(suit, number))
+        return self._registry()[engine.card(suit, number)]
+    
+    def get_by_pk(self, pk):
+        self._registry()
+        try:
+            return CardManager._by_pk[pk]
+        except KeyError:
+            raise self.model.DoesNotExist('No card with pk {}'.format(pk))
     
     def get_by_identifier(self, card_identifier):
-        suit_letter = card_identifier[0]
-        suit = None
-        for possible_suit in self.model.SUITS:
-            if self.model.SUIT_MAP[possible_suit[1]] == suit_letter:
-                suit = possible_suit[0]
-        if suit is None:
-            raise Exception('Card identifier does not have a valid suit: {}'.format(card_identifier))
-        number = int(card_identifier[1:])
-        return self.get(suit=suit, number=number)
+        try:
+            return self._registry()[self.model.INDICES[card_identifier]]
+        except KeyError:
+            raise self.model.DoesNotExist('No card with identifier {}'.format(card_identifier))
+    
+    def in_set(self, cards):
+        """
+        Returns the cards in the given card set (see game.cardset), ordered by
+        suit and number
+        
+        """
+        registry = self._registry()
+        return sorted((registry[card] for card in cardset.cards(cards)), key=lambda card: (card.suit, card.number))
         
 class Card(models.Model):
     """
     This class represents a card
     
     """
-    CLUBS, DIAMONDS, HEARTS, SPADES = 0, 1, 2, 3
+    CLUBS, DIAMONDS, HEARTS, SPADES = engine.CLUBS, engine.DIAMONDS, engine.HEARTS, engine.SPADES
     SUITS = ((CLUBS, 'w'), (DIAMONDS, 'e'), (HEARTS, 'r'), (SPADES, 'q'))
     SUIT_MAP = {'w': 'C', 'e': 'D', 'r': 'H', 'q': 'S'}
     
+    # The identifier and image of every card, by index in the game engine
+    IDENTIFIERS = tuple('%s%s' % ('CDHS'[engine.card_suit(index)], engine.card_number(index)) for index in range(engine.DECK_SIZE))
+    IMAGE_FILES = tuple('img/cards/%s.png' % identifier for identifier in IDENTIFIERS)
+    INDICES = dict((identifier, index) for index, identifier in enumerate(IDENTIFIERS))
+    
     objects = CardManager()
     
     class Meta:
@@ -46,18 +103,23 @@ class Card(models.Model):
     suit = models.PositiveSmallIntegerField(choices=SUITS)
     
     def worth(self):
-        if self.number == 1:
-            return 13
-        return self.number - 1
+        return engine.worth(self.number)
+    
+    def index(self):
+        """
+        The number of this card in the game engine
+        
+        """
+        return engine.card(self.suit, self.number)
     
     def __unicode__(self):
         return '%s of %s' % (self.number, self.get_suit_display())
     
     def identifier(self):
-        return '%s%s' % (self.SUIT_MAP[self.get_suit_display()], self.number)
+        return self.IDENTIFIERS[self.index()]
     
     def image_file(self):
-        return 'img/cards/%s.png' % self.identifier()
+        return self.IMAGE_FILES[self.index()]
 
 class Bid(models.Model):
     """
@@ -65,21 +127,18 @@ class Bid(models.Model):
     
     """
     
-    class IllegalChoiceException(Exception):
-        pass
+    IllegalChoiceException = engine.IllegalChoiceException
     
-    PASS, RIK, RIKp1, MISERIE, RIKp2, RIKp3, OPENMISERIEKAART, OPENALLESKAART, RIKp4, RIKp5, OPENMISERIE, OPENALLES = 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11
+    PASS, RIK, RIKp1, MISERIE, RIKp2, RIKp3, OPENMISERIEKAART, OPENALLESKAART, RIKp4, RIKp5, OPENMISERIE, OPENALLES = range(12)
     BIDS = ((RIK, 'Rik'), (RIKp1, 'Rik voor 9'), (MISERIE, 'Miserie'), (RIKp2, 'Rik voor 10'), (RIKp3, 'Rik voor 11'),
             (OPENMISERIEKAART, 'Open miserie met kaart'), (OPENALLESKAART, 'Open voor alles met kaart'), (RIKp4, 'Rik voor 12'),
             (RIKp5, 'Rik voor 12'), (OPENMISERIE, 'Open miserie'), (OPENALLES, 'Open voor alles'), (PASS, 'Pas'))
-    TRICKS_REQUIRED = {RIK: 8, RIKp1: 9, RIKp2: 10, RIKp3: 11, RIKp4: 12, RIKp5: 13}
-    POINTS = {MISERIE: 9, OPENMISERIEKAART: 12, OPENALLESKAART: 15, OPENMISERIE: 18, OPENALLES: 21}
+    TRICKS_REQUIRED = engine.TRICKS_REQUIRED
+    POINTS = engine.POINTS
     
     class Meta:
         ordering = ['-bid', ]
         
-    bid_lock = global_lock
-    
     round = models.ForeignKey('Round', related_name='bids')
     player = models.ForeignKey(settings.AUTH_USER_MODEL)
     
@@ -96,140 +155,74 @@ class Bid(models.Model):
     
     @classmethod
     def bid_is_rik(cls, bid):
-        return bid in [cls.RIK, cls.RIKp1, cls.RIKp2, cls.RIKp3, cls.RIKp4, cls.RIKp5]
+        return engine.is_rik(bid)
     
     @classmethod
     def bid_is_miserie(cls, bid):
-        return bid in [cls.MISERIE, cls.OPENMISERIEKAART, cls.OPENMISERIE]
+        return engine.is_miserie(bid)
     
     @classmethod
     def bid_is_vooralls(cls, bid):
-        return bid in [cls.OPENALLESKAART, cls.OPENALLES]
+        return engine.is_vooralles(bid)
     
     def is_rik(self):
-        with self.bid_lock:
-            return self.bid_is_rik(self.bid)
+        return self.bid_is_rik(self.bid)
         
     def is_miserie(self):
-        with self.bid_lock:
-            return self.bid_is_miserie(self.bid)
+        return self.bid_is_miserie(self.bid)
         
     def is_vooralles(self):
-        with self.bid_lock:
-            return self.bid_is_vooralls(self.bid)
+        return self.bid_is_vooralls(self.bid)
         
     def tricks_needed_to_win(self):
-        with self.bid_lock:
-            if self.is_rik():
-                return self.TRICKS_REQUIRED[self.bid]
-            elif self.bid in [self.OPENALLESKAART, self.OPENALLES]:
-                return 13
-            else:
-                # This is not applicable for Miserie
-                return None
+        return engine.tricks_needed_to_win(self.bid)
     
     def points_to_earn(self):
-        with self.bid_lock:
-            if self.is_rik():
-                # This depends on the game
-                return None
-            return self.POINTS[self.bid]
+        return engine.points_to_earn(self.bid)
     
     def trump_suit_needed(self):
-        with self.bid_lock:
-            if self.bid in [self.MISERIE, self.OPENMISERIEKAART, self.OPENMISERIE]:
-                return False
-            return True
+        return engine.trump_suit_needed(self.bid)
     
     def mate_card_needed(self):
-        with self.bid_lock:
-            return self.is_rik()
+        return engine.mate_card_needed(self.bid)
     
     def is_complete(self):
-        with self.bid_lock:
-            if self.trump_suit_needed() and self.trump_suit is None:
-                return False
-            if self.mate_card_needed() and (self.mate_suit is None or self.mate_card is None):
-                return False
-            return True
+        if self.trump_suit_needed() and self.trump_suit is None:
+            return False
+        if self.mate_card_needed() and (self.mate_suit is None or self.mate_card is None):
+            return False
+        return True
     
     def mate_card_display(self):
-        with self.bid_lock:
-            return Card.get_card_number_display(self.mate_card)
+        return Card.get_card_number_display(self.mate_card)
     
         
     def get_bidding_finalize_form(self):
-        with self.bid_lock:
-            if self.trump_suit_needed():
-                if self.mate_card_needed():
-                    from forms import PickTrumpSuitAndMateForm
-                    return PickTrumpSuitAndMateForm
-                from forms import PickTrumpSuitForm
-                return PickTrumpSuitForm
-            return None
-        
-    def finalize(self, player, trump_suit=None, mate_suit=None):
-        with self.bid_lock:
-            if player != self.player:
-                raise GameException('Player {} trying to finalize bid while {} has the highest bid'.format(player, self.player))
-                
-            if self.trump_suit_needed():
-                if trump_suit is None:
-                    raise self.IllegalChoiceException('You must choose a trump suit')
-                    
-                if self.mate_card_needed():
-                    if mate_suit is None:
-                        raise self.IllegalChoiceException('You must choose a mate card')
-                    elif trump_suit == mate_suit:
-                        raise self.IllegalChoiceException('You cannot pick the trump suit as mate.')
-                    else:
-                        # Check if the given mate suit can be picked
-                        asking_hand = [cih.card for cih in CardInHand.objects.filter(isplaying__game=self.round.game, isplaying__player=player)]
-                        # We first assume the mate card number is the Ace, which is always the case unless the asking
-                        # player has all 4 aces.
-                        mate_cardnumber = 1
-                        
-                        while True:
-                            if len(filter(lambda card: (card.number == mate_cardnumber and card.suit == mate_suit), asking_hand)) > 0:
-                                # The player has the highest card of the asked mate suit. This is only allowed if he has all of
-                                # the highest cards except that of the trump suit 
-                                if len(filter(lambda card: (card.number == mate_cardnumber and card.suit != trump_suit), asking_hand)) < 3:
-                                    # The player has the option of picking another mate suit, it follows that this mate suit is an illegal
-                                    # choice
-                                    raise self.IllegalChoiceException('You must pick another mate suit. You have the highest card of the chosen mate suit and there are other options.')
-                                # The player has all other cards of this number, so it would still appear this is an ok suit to pick, we must
-                                # go deeper
-                                mate_cardnumber -= 1
-                                if mate_cardnumber <= 0:
-                                    mate_cardnumber = 13
-                                elif mate_cardnumber <= 1:
-                                    raise Exception('Looping infinitely for some reason')
-                                continue
-                            # The player does not have the highest card of the chosen mate suit, this is an ok choice
-                            break
-                            
-                    self.mate_suit = mate_suit
-                    self.mate_card = mate_cardnumber
-                        
-                self.trump_suit = trump_suit
-                    
-                self.save()
+        if self.trump_suit_needed():
+            if self.mate_card_needed():
+                from forms import PickTrumpSuitAndMateForm
+                return PickTrumpSuitAndMateForm
+            from forms import PickTrumpSuitForm
+            return PickTrumpSuitForm
+        return None
+
 
 class Round(models.Model):
     """
     This class represents a round of cards that is currently being played
     
     """
-    class BadBidException(Exception):
-        pass
+    BadBidException = engine.BadBidException
     
     class Meta():
         ordering = ('-id', )
     
-    round_lock = global_lock
+    @property
+    def round_lock(self):
+        return game_locks.hold(self.game_id)
         
     # Round phases
-    BIDDING_PHASE, FINALIZE_BIDDING_PHASE, TRICK_TAKING_PHASE, END_OF_ROUND_PHASE = 0, 1, 2, 3
+    BIDDING_PHASE, FINALIZE_BIDDING_PHASE, TRICK_TAKING_PHASE, END_OF_ROUND_PHASE = engine.BIDDING_PHASE, engine.FINALIZE_BIDDING_PHASE, engine.TRICK_TAKING_PHASE, engine.END_OF_ROUND_PHASE
     
     game = models.ForeignKey('Game', related_name='rounds')
     
@@ -241,6 +234,17 @@ class Round(models.Model):
     
     mate = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, related_name='mate_in_games')
     
+    # The progress of the round, kept up to date with every action so it can be read without loading the
+    # round state. The current trick is the trick with number collected_tricks. Empty for old rounds.
+    phase = models.PositiveSmallIntegerField(null=True, blank=True)
+    collected_tricks = models.PositiveSmallIntegerField(null=True, blank=True)
+    team_tricks = models.PositiveSmallIntegerField(null=True, blank=True)
+    # The bidding so far: the seat to bid next, the seats that passed as a bit mask and the highest bid
+    next_bidder = models.PositiveSmallIntegerField(null=True, blank=True)
+    passed_seats = models.PositiveSmallIntegerField(default=0)
+    high_bid = models.PositiveSmallIntegerField(null=True, blank=True)
+    high_bidder = models.PositiveSmallIntegerField(null=True, blank=True)
+    
     
     def __unicode__(self):
         try:
@@ -258,211 +262,239 @@ class Round(models.Model):
     _tricks_cache = None
     def all_tricks(self):
         if self._tricks_cache is None:
-            self._tricks_cache = self.tricks.prefetch_related('cards').all()
+            self._tricks_cache = list(self.tricks.prefetch_related('playedintrick_set').order_by('number'))
+            for trick in self._tricks_cache:
+                trick.round = self
+                for played in trick.playedintrick_set.all():
+                    played.card = Card.objects.get_by_pk(played.card_id)
         return self._tricks_cache
     
+    _state_cache = None
+    def state(self):
+        """
+        Returns the engine state of this round. It is loaded from the database
+        once and kept up to date by the actions taken through this instance.
+        
+        """
+        if self._state_cache is None:
+            self._state_cache = self.load_state()
+        return self._state_cache
+    
+    def load_state(self):
+        game = self.game
+        
+        if self.id == game.current_round_id:
+            game_state = game.load_state()
+            if game_state is not None and game_state.round is not None:
+                return game_state.round
+        return self.load_state_from_rows()
+    
+    def load_state_from_rows(self):
+        game = self.game
+        
+        hands = [isplaying.hand for isplaying in game.seating().isplayings]
+        
+        state = engine.RoundState(game.seat_of(self.dealer_id), hands)
+        for bid in sorted(self.all_bids(), key=lambda bid: bid.id):
+            state.bids.append((game.seat_of(bid.player_id), bid.bid))
+        
+        if self.highest_bid_id is not None:
+            state.bidder = game.seat_of(self.highest_bid.player_id)
+            state.bid = self.highest_bid.bid
+            state.trump_suit = self.highest_bid.trump_suit
+            if self.highest_bid.mate_card is not None:
+                state.mate_suit = self.highest_bid.mate_suit
+                state.mate_card = engine.card(self.highest_bid.mate_suit, self.highest_bid.mate_card)
+                state.mate = game.seat_of(self.mate_id)
+        
+        for trick in self.all_tricks():
+            trick_state = engine.TrickState(game.seat_of(trick.leading_player_id))
+            for played in trick.all_playedintrick():
+                card = played.card.index()
+                trick_state.plays.append((game.seat_of(played.played_by_id), card))
+                trick_state.cards |= cardset.bit(card)
+                state.played |= cardset.bit(card)
+            trick_state.collected = trick.collected
+            state.tricks.append(trick_state)
+        engine.recount(state)
+        engine.open_trick(state)
+        
+        return state
+    
+    def update_progress(self, save=True):
+        """
+        Store the phase, the bidding and the trick counts of the round state
+        with the round. Without save, the caller saves the round itself.
+        
+        """
+        state = self.state()
+        high_bidder, high_bid = state.high if state.high is not None else (None, None)
+        progress = (engine.current_phase(state), engine.tricks_collected(state), engine.asking_team_tricks(state),
+                    engine.next_bidder(state), state.passed, high_bid, high_bidder)
+        if progress != self.progress():
+            (self.phase, self.collected_tricks, self.team_tricks,
+             self.next_bidder, self.passed_seats, self.high_bid, self.high_bidder) = progress
+            if save:
+                # The action that made this progress notifies the players itself
+                super(Round, self).save(update_fields=self.PROGRESS_FIELDS)
+    
+    PROGRESS_FIELDS = ['phase', 'collected_tricks', 'team_tricks', 'next_bidder', 'passed_seats', 'high_bid', 'high_bidder']
+    def progress(self):
+        return tuple(getattr(self, field) for field in self.PROGRESS_FIELDS)
+    
     def tricks_played(self):
-        with self.round_lock:
-            return len(filter(lambda trick: trick.collected, self.all_tricks()))
+        if self.collected_tricks is None:
+            return engine.tricks_collected(self.state())
+        return self.collected_tricks
         
     def all_tricks_played(self):
-        with self.round_lock:
-            return self.tricks_played() >= 13
+        return self.tricks_played() >= engine.TRICKS_PER_ROUND
         
     def asking_team_tricks(self):
         """
         Returns the amount of tricks currently won by the asking team
         
         """
-        with self.round_lock:
-            tricks_won = 0
-            for trick in self.all_tricks():
-                if trick.collected:
-                    if (trick.winner() == self.highest_bid.player) or (self.mate is not None and trick.winner() == self.mate):
-                        tricks_won += 1
-            return tricks_won
+        if self.team_tricks is None:
+            return engine.asking_team_tricks(self.state())
+        return self.team_tricks
     
     def asking_team_won(self):
         """
         Returns wether the asking team won this round
         
         """
-        with self.round_lock:
-            if self.highest_bid is None:
-                return None
-            
-            if self.highest_bid.is_rik():
-                if not self.all_tricks_played():
-                    return None
-                return self.asking_team_tricks() >= self.highest_bid.tricks_needed_to_win()
-            
-            elif self.highest_bid.is_miserie():
-                if self.asking_team_tricks() > 0:
-                    return False
-                elif self.all_tricks_played():
-                    return True
-                return None
-            
-            elif self.highest_bid.is_vooralles():
-                if self.asking_team_tricks() < len(self.all_tricks()):
-                    return False
-                elif self.all_tricks_played():
-                    return True
-                return None
-            
-            raise Exception('Unknown Bid')
+        return engine.asking_team_won(self.state())
     
     def is_finished(self):
         return self.asking_team_won() is not None
     
     def current_phase(self):
-        with self.round_lock:
-            if self.highest_bid is None:
-                return self.BIDDING_PHASE
-            elif not self.highest_bid.is_complete():
-                return self.FINALIZE_BIDDING_PHASE
-            elif not self.is_finished():
-                return self.TRICK_TAKING_PHASE
-            else:
-                return self.END_OF_ROUND_PHASE
-            
+        if self.phase is None:
+            return engine.current_phase(self.state())
+        return self.phase
+        
     def underway(self):
         return self.current_phase() is not self.END_OF_ROUND_PHASE
         
         
         
     
-    def round_players_ordered(self):
-        """
-        Return a list of the players in this round in the order that they should play/bid. This
-        means: [player_after_dealer, next_player, next_player, dealer]
-        
-        """
-        with self.round_lock:
-            next_player = self.game.get_next_player(self.dealer)
-            while True:
-                yield next_player
-                if next_player == self.dealer:
-                    return
-                next_player = self.game.get_next_player(next_player)
+    def next_bidder_seat(self):
+        if self.phase is None or (self.phase is self.BIDDING_PHASE and self.next_bidder is None):
+            # A round from before the bidding was stored with it
+            return engine.next_bidder(self.state())
+        elif self.phase is self.BIDDING_PHASE:
+            return self.next_bidder
+        return None
     
     def next_player_to_bid(self):
-        with self.round_lock:
-            bids = self.all_bids()
+        seat = self.next_bidder_seat()
+        if seat is None:
+            return None
+        return self.game.player_at(seat)
+            
             
-            players = list(self.round_players_ordered())
-            if len(filter(lambda bid: bid.bid == Bid.PASS, bids)) >= 3 and len(bids) > 3:
-                # Everybody but 1 player has passed and bids have been placed, no more bidding is needed
-                return None
             
-            bidding_round = 1
-            while True:
-                for player in players:
-                    if len(filter(lambda bid: bid.player == player, bids)) < bidding_round:
-                        # This player has not yet bid this round
-                        if len(filter(lambda bid: (bid.player == player and bid.bid == Bid.PASS), bids)) > 0:
-                            # This player has passed before, so he may not bid again
-                            continue
-                        return player
-                # Every player has bid this round, check the next round
-                bidding_round += 1
-                
-                
-                
     
     def temp_highest_bid(self):
-        with self.round_lock:
-            try:
-                last_bid = self.all_bids()[0]
-                if last_bid.bid != Bid.PASS:
-                    return last_bid
-            except IndexError:
-                pass
-            return None
+        try:
+            last_bid = self.all_bids()[0]
+            if last_bid.bid != Bid.PASS:
+                return last_bid
+        except IndexError:
+            pass
+        return None
+    
+    def legal_bids(self, player):
+        """
+        Returns the bids the given player can choose from now, see
+        engine.legal_bids
+        
+        """
+        return engine.legal_bids(self.state(), self.game.seat_of(player.id))
+    
+    def legal_finalizations(self, player):
+        """
+        Returns every (trump suit, mate suit, mate card number) the given player
+        can finalize his bid with now
+        
+        """
+        return [(trump_suit, mate_suit, engine.card_number(mate_card) if mate_card is not None else None)
+                for trump_suit, mate_suit, mate_card in engine.legal_finalizations(self.state(), self.game.seat_of(player.id))]
     
     def place_bid(self, player, bid):
         with self.round_lock:
-            if self.current_phase() is not self.BIDDING_PHASE:
-                raise GameException('Player {} trying to place bid in phase {}'.format(player.username, self.current_phase()))
-            if player != self.next_player_to_bid():
-                raise GameException('Player {} trying to bid while it is {}\'s turn to bid'.format(player, self.next_player_to_bid()))
-            
-            if len(filter(lambda bid: (bid.player == player and bid.bid == Bid.PASS), self.all_bids())) > 0:
-                raise GameException('This player ({}) has already passed and should not be allowed to place another bid.'.format(player.username))
+            state = self.state()
+            engine.place_bid(state, self.game.seat_of(player.id), bid)
             
+            bid = Bid(round=self, player=player, bid=bid)
+            bid.save()
+            self._bids_cache = None
+            self.game.record(events.BID, state.bids[-1][0], state.bids[-1][1])
             
-            current_highest_bid = self.temp_highest_bid()
-            if current_highest_bid is None or bid > current_highest_bid.bid or bid == Bid.PASS:
-                if bid == Bid.PASS:
-                    # Make sure this is not the last player passing when everyone else has passed
-                    amount_of_players = len(self.game.players.all())
-                    notpass_present = False
-                    passes = 0
-                    for tmp_bid in self.all_bids():
-                        if tmp_bid.bid == Bid.PASS:
-                            passes += 1
-                        else:
-                            notpass_present = True
-                    if not notpass_present and passes >= (amount_of_players - 1):
-                        raise self.BadBidException('You are the last player to bid and every other player has passed. You must place a bid.')
-                     
-                bid = Bid(round=self, player=player, bid=bid)
-                bid.save()
-                self._bids_cache = None
-                
-                if self.next_player_to_bid() is None:
-                    # Bidding is done, set the highest bid
-                    self.highest_bid = self.temp_highest_bid()                
-                    self.save()
-                
-                self.advance()
-                self.changed()
-                
+            if state.bid is not None:
+                # Bidding is done, set the highest bid
+                self.highest_bid = self.temp_highest_bid()                
+                self.update_progress(save=False)
+                self.save()
             else:
-                raise self.BadBidException('Please bid higher than the currently placed bid.')
+                self.update_progress()
+            
+            self.advance()
+            self.changed()
         
     def finalize_bid(self, player, trump_suit=None, mate_suit=None):
         with self.round_lock:
-            if self.current_phase() is not self.FINALIZE_BIDDING_PHASE:
-                raise GameException('Player {} trying to finalize bid during phase {}'.format(player, self.current_phase()))
+            state = self.state()
+            engine.finalize_bid(state, self.game.seat_of(player.id), trump_suit, mate_suit)
+            self.game.record(events.FINALIZE, state.bidder, [trump_suit, mate_suit])
             
-            self.highest_bid.finalize(player, trump_suit, mate_suit)
+            self.highest_bid.trump_suit = state.trump_suit
+            if state.mate_card is not None:
+                self.highest_bid.mate_suit = state.mate_suit
+                self.highest_bid.mate_card = engine.card_number(state.mate_card)
+            self.highest_bid.save()
             
-            if self.highest_bid.mate_card_needed():
-                mate_card = Card.objects.get(suit=self.highest_bid.mate_suit, number=self.highest_bid.mate_card)
-                self.mate = self.game.players.get(isplaying__cards=mate_card)
+            if state.mate is not None:
+                self.mate = self.game.player_at(state.mate)
+                self.update_progress(save=False)
                 self.save()
+            else:
+                self.update_progress()
+            
+            # The first trick is up
+            self.advance()
+    
+    def legal_plays(self, player):
+        """
+        Returns the cards the given player may play now, ordered by suit and
+        number, none if it is not his turn
+        
+        """
+        return Card.objects.in_set(engine.legal_plays(self.state(), self.game.seat_of(player.id)))
     
     def current_trick(self):
         with self.round_lock:
             if self.current_phase() is not self.TRICK_TAKING_PHASE:
                 raise GameException('Trying to get current trick while in phase {}'.format(self.current_phase()))
             
-            try:
-                uncollected_tricks = filter(lambda trick: not trick.collected, self.all_tricks())
-                if len(uncollected_tricks) > 1:
-                    raise Exception('Multiple uncollected tricks')
-                current_trick = uncollected_tricks[0]
-            except IndexError:
-                prev_tricks = sorted(self.all_tricks(), key=lambda trick: trick.number, reverse=True)
-                if len(prev_tricks) <= 0:
-                    leader = self.game.get_next_player(self.dealer)
-                else:
-                    leader = prev_tricks[0].winner()
-                current_trick = Trick(number=self.tricks.count(), leading_player=leader)
+            state = self.state()
+            number = len(state.tricks) - 1
+            tricks = self.all_tricks()
+            if len(tricks) <= number:
+                # The engine started a new trick that is not stored yet
+                current_trick = Trick(number=number, leading_player=self.game.player_at(state.tricks[number].leader))
                 self.tricks.add(current_trick)
-                self._tricks_cache = None
+                current_trick.round = self
+                tricks.append(current_trick)
             
-            return current_trick
+            return tricks[number]
     
     def previous_trick(self):
-        with self.round_lock:
-            try:
-                previous_trick = sorted(self.all_tricks(), key=lambda trick: trick.number, reverse=True)[1]
-            except IndexError:
-                previous_trick = None
-            
-            return previous_trick
+        if engine.previous_trick(self.state()) is None:
+            return None
+        return self.all_tricks()[len(self.state().tricks) - 2]
         
         
         
@@ -475,44 +507,18 @@ class Round(models.Model):
         round (can be negative)
         
         """
-        with self.round_lock:
-            if not self.is_finished():
-                return GameException('Round is not yet finished')
-            
-            if self.highest_bid.is_rik():
-                tricks_won = self.asking_team_tricks()
-                tricks_needed = self.highest_bid.tricks_needed_to_win()
-                
-                if tricks_won >= tricks_needed:
-                    return tricks_won - tricks_needed + 1
-                return tricks_won - tricks_needed - 1
-            
-            if self.asking_team_won():
-                return self.highest_bid.points_to_earn()
-            return -self.highest_bid.points_to_earn()
+        if not self.is_finished():
+            return GameException('Round is not yet finished')
+        return engine.asking_team_points(self.state())
     
     def other_player_points(self):
-        with self.round_lock:
-            if self.highest_bid.is_rik():
-                return -self.asking_team_points()
-            else:
-                return -self.asking_team_points()/3
+        return engine.other_player_points(self.state())
     
     def get_points_earned(self, player):
-        with self.round_lock:
-            if player == self.highest_bid.player or player == self.mate:
-                return self.asking_team_points()
-            return self.other_player_points()
+        return engine.points_earned(self.state(), self.game.seat_of(player.id))
     
     def mate_card_played(self):
-        with self.round_lock:
-            if self.highest_bid is not None:
-                try:
-                    PlayedInTrick.objects.get(card__number=self.highest_bid.mate_card, card__suit=self.highest_bid.mate_suit, trick__round=self)
-                    return True
-                except:
-                    pass
-            return False
+        return engine.mate_card_played(self.state())
     
     
     
@@ -525,8 +531,7 @@ class Round(models.Model):
         they can update their game screen
     
         """
-        with self.round_lock:
-            self.game.changed()
+        self.game.changed()
     
     def advance(self):
         """
@@ -558,13 +563,14 @@ class Score(models.Model):
 
 class Trick(models.Model):
     
-    class BadPlayException(Exception):
-        pass
+    BadPlayException = engine.BadPlayException
     
     # Trick phases
     PLAY_PHASE, DONE_PHASE = 0, 1
     
-    trick_lock = global_lock
+    @property
+    def trick_lock(self):
+        return game_locks.hold(self.round.game_id)
     
     round = models.ForeignKey(Round, related_name='tricks')
     number = models.PositiveSmallIntegerField(default=0)
@@ -582,101 +588,80 @@ class Trick(models.Model):
     _cards_cache = None
     def all_playedintrick(self):
         if self._cards_cache is None:
-            self._cards_cache = self.playedintrick_set.select_related('card', 'played_by').all()
+            self._cards_cache = sorted(self.playedintrick_set.all(), key=lambda played: played.ordinal)
         return self._cards_cache
     
+    def state(self):
+        """
+        Returns the engine state of this trick
+        
+        """
+        return self.round.state().tricks[self.number]
+    
     def next_player_to_play(self):
-        with self.trick_lock:
-            cards = self.all_playedintrick()
-            if len(cards) >= 4:
-                # Everybody has played a card, this trick is done
-                return None
-            elif len(cards) <= 0:
-                return self.leading_player
-            
-            players = list(self.round.round_players_ordered())
-            while players[0].id != self.leading_player_id:
-                players.append(players[0])
-                del players[0]
-            
-            for player in players:
-                if len(filter(lambda played: played.played_by == player, cards)) <= 0:
-                    return player
-            raise Exception('Some player has played two cards: {}'.format(list(cards)))
+        seat = engine.next_to_play(self.state())
+        if seat is None:
+            # Everybody has played a card, this trick is done
+            return None
+        return self.round.game.player_at(seat)
     
     def is_done(self):
-        with self.trick_lock:
-            return self.next_player_to_play() is None
+        return self.state().is_done()
     
     def current_phase(self):
-        with self.trick_lock:
-            if self.is_done():
-                return self.DONE_PHASE
-            return self.PLAY_PHASE
+        if self.is_done():
+            return self.DONE_PHASE
+        return self.PLAY_PHASE
     
     def winner(self):
-        with self.trick_lock:
-            if self.current_phase() is not self.DONE_PHASE:
-                return None
-            
-            trump_cards = sorted(filter(lambda played: played.card.suit == self.round.highest_bid.trump_suit, self.all_playedintrick()), key=lambda x: x.card.worth(), reverse=True)
-            if len(trump_cards) > 0:
-                return trump_cards[0].played_by
-            tmp = sorted(filter(lambda played: played.card.suit == self.requested_suit, self.all_playedintrick()), key=lambda x: x.card.worth(), reverse=True)
-            return tmp[0].played_by
+        seat = engine.trick_winner(self.round.state(), self.state())
+        if seat is None:
+            return None
+        return self.round.game.player_at(seat)
     
     
     
     
     def play_card(self, player, card):
         with self.trick_lock:
-            if self.current_phase() is not self.PLAY_PHASE:
-                raise GameException('Player {} trying to play card in phase {}'.format(player, self.current_phase()))
-            if self.next_player_to_play() != player:
-                raise GameException('Player {} trying to play card while {} is next in line'.format(player, self.next_player_to_play()))
+            if self.number != len(self.round.state().tricks) - 1:
+                raise GameException('Player {} trying to play card in trick {} which is not the current trick'.format(player, self.number))
             
-            try:
-                CardInHand.objects.get(isplaying__game=self.round.game, isplaying__player=player, card=card)
-            except CardInHand.DoesNotExist:
-                raise GameException('Player {} trying to play card {}, but he does not have it in his hand'.format(player, card))
+            seat = self.round.game.seat_of(player.id)
+            engine.play_card(self.round.state(), seat, card.index())
+            self.round.game.record(events.PLAY, seat, card.index())
             
             ordinal = len(self.all_playedintrick())
             if ordinal == 0:
                 self.requested_suit = card.suit
                 self.save()
-           
-            if card.suit != self.requested_suit:
-                # Check if the player does not have any cards of the requested suit left
-                if IsPlaying.objects.get(game=self.round.game, player=player).cards.filter(suit=self.requested_suit).exists():
-                    raise self.BadPlayException("You must follow suit if possible.")
-            else:
-                if player == self.round.mate:
-                    # This is the mate playing
-                    if self.leading_player == self.round.highest_bid.player and self.requested_suit == self.round.highest_bid.mate_suit:
-                        # The leading player has requested the mate card
-                        if card.number != self.round.highest_bid.mate_card:
-                            # Mate must play the mate card
-                            raise self.BadPlayException("You must play the mate card if requested by the leading player.")
             
-            PlayedInTrick(card=card, trick=self, ordinal=ordinal, played_by=player).save()
-            CardInHand.objects.get(isplaying__game=self.round.game, isplaying__player=player, card=card).delete()
+            played = PlayedInTrick(card=card, trick=self, ordinal=ordinal, played_by=player)
+            played.save()
+            isplaying = self.round.game.seating().isplaying_at(seat)
+            isplaying.hand = self.round.state().hands[seat]
+            IsPlaying.objects.filter(id=isplaying.id).update(hand=isplaying.hand)
             
-            self._cards_cache = None
+            self.all_playedintrick().append(played)
             
             self.advance()
             self.changed()
     
     def collect(self, player):
         with self.trick_lock:
-            if self.current_phase() is not self.DONE_PHASE:
-                raise GameException('Player {} trying to collect a trick during phase {}'.format(player, self.current_phase()))
-            if self.winner() != player:
-                raise GameException('Player {} trying to collect a trick he did not win'.format(player))
+            if self.number != len(self.round.state().tricks) - 1:
+                raise GameException('Player {} trying to collect trick {} which is not the current trick'.format(player, self.number))
+            
+            seat = self.round.game.seat_of(player.id)
+            engine.collect(self.round.state(), seat)
+            self.round.game.record(events.COLLECT, seat)
             
             self.collected = True
             self.save()
+            self.round.update_progress()
             
-            self.advance()
+            # The next trick is up
+            self.round.advance()
             self.changed()
             
         
@@ -688,8 +673,7 @@ class Trick(models.Model):
         they can update their game screen
     
         """
-        with self.trick_lock:
-            self.round.changed()
+        self.round.changed()
     
     def advance(self):
         """
@@ -748,7 +732,6 @@ class GameManager(models.Manager):
             'current_round__highest_bid__player').prefetch_related(
                 'players',
                 'isplaying_set__player', 
-                'isplaying_set__cards', 
                 'current_round__bids__player').get(id=game_id)
         if game.current_round is not None:
             game.current_round.game = game
@@ -766,18 +749,26 @@ class Game(models.Model):
     # Game States
     BEFORE_ROUND, DURING_ROUND, AFTER_ROUND = 0, 1, 2
     
-    game_lock = global_lock
+    @property
+    def game_lock(self):
+        return game_locks.hold(self.id)
     
     objects = GameManager()
     
     players = models.ManyToManyField(settings.AUTH_USER_MODEL, through='IsPlaying')
     
-    deck = models.ManyToManyField(Card, through='IsInDeck')
+    # The engine indices of the cards in the deck, one byte per card, starting with the bottom card
+    deck = models.BinaryField(default=b'')
     deck_initialized = models.BooleanField(default=False)
     
     current_round = models.OneToOneField(Round, null=True, blank=True, default=None, related_name='game_current')
     round_number = models.PositiveIntegerField(default=0, editable=False)
     
+    # Raised every time something changes in this game
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # The sequence number of the last event in the log of this game
+    event_sequence = models.PositiveIntegerField(default=0, editable=False)
+    
     def __unicode__(self):
         return 'Game #%s' % self.pk
     
@@ -794,74 +785,73 @@ class Game(models.Model):
         Returns the current state of the game
         
         """
-        with self.game_lock:
-            if not self.deck_initialized:
-                return None
-            elif self.current_round is None:
-                return self.BEFORE_ROUND
-            elif self.current_round.underway():
-                return self.DURING_ROUND
-            else:
-                return self.AFTER_ROUND
+        if not self.deck_initialized:
+            return None
+        elif self.current_round is None:
+            return self.BEFORE_ROUND
+        elif self.current_round.underway():
+            return self.DURING_ROUND
+        else:
+            return self.AFTER_ROUND
     
     def everybody_accepted(self):
         """
         Check if every participant has accepted to play in this game
         
         """
-        with self.game_lock:
-            for isplaying in self.isplaying_set.all():
-                if not isplaying.accepted:
-                    return False
-            return True
+        for isplaying in self.isplaying_set.all():
+            if not isplaying.accepted:
+                return False
+        return True
     
     def current_dealer(self):
         """
         The current dealer of this game
         
         """
-        with self.game_lock:
-            if self.round_number <= 0:
-                return None
-            ao_players = len(self.players.all())
-            dealer_seat = (self.round_number - 1) % ao_players
-            
-            return self.players.get(seat=dealer_seat)
+        if self.round_number <= 0:
+            return None
+        return self.player_at(engine.dealer_for_round(self.round_number))
     
     def next_dealer(self):
         """
         The player that will be dealing next round
         
         """
-        with self.game_lock:
-            ao_players = len(self.players.all())
-            dealer_seat = self.round_number % ao_players
-            
-            for isplaying in self.isplaying_set.all():
-                if isplaying.seat == dealer_seat:
-                    return isplaying.player
-            raise Exception('Bad dealer seat: {}'.format(dealer_seat))
+        return self.player_at(engine.dealer_for_round(self.round_number + 1))
+        
+    _seating_cache = None
+    def seating(self):
+        """
+        Returns the seating of this game, 'player_id in game.seating()' tells
+        whether a player is playing in this game
         
+        """
+        if self._seating_cache is None:
+            self._seating_cache = Seating(self.isplaying_set.all())
+        return self._seating_cache
+    
+    def seat_of(self, player_id):
+        try:
+            return self.seating().seat_of(player_id)
+        except KeyError:
+            raise GameException('Player (id: {}) is not playing in this game (id: {})'.format(player_id, self.id))
+    
+    def player_at(self, seat):
+        try:
+            player = self.seating().player_at(seat)
+        except (IndexError, TypeError):
+            player = None
+        if player is None:
+            raise GameException('Bad seat number: {}'.format(seat))
+        return player
+    
     def get_next_player(self, current_player):
         """
         Returns the player that should play after the given player
         
         """
-        with self.game_lock:
-            current_isplaying = None
-            for isplaying in self.isplaying_set.all():
-                if isplaying.player == current_player:
-                    current_isplaying = isplaying
-                    break
-            if current_isplaying is None:
-                raise Exception('Player (id: {}) is nog playing in this game (id: {})'.format(current_player.id, self.id))
-            
-            seats = len(self.isplaying_set.all())
-            next_seat = (current_isplaying.seat + 1) % seats
-            for isplaying in self.isplaying_set.all():
-                if isplaying.seat == next_seat:
-                    return isplaying.player
-            raise Exception('Bad next seat number: {}'.format(next_seat))
+        return self.player_at(engine.next_seat(self.seat_of(current_player.id)))
         
         
     
@@ -875,15 +865,10 @@ class Game(models.Model):
             if self.current_state() is not None:
                 raise GameException('Trying to initialize the deck during game state: {}'.format(self.current_state()))
             
-            self.deck.clear()
+            cards = list(range(engine.DECK_SIZE))
+            random.shuffle(cards)
             
-            card_no = 0
-            cards_in_deck = []
-            for card in Card.objects.all().order_by('?'):
-                isindeck = IsInDeck(card=card, game=self, ordinal=card_no)
-                cards_in_deck.append(isindeck)
-                card_no += 1
-            IsInDeck.objects.bulk_create(cards_in_deck)
+            self.set_deck(cards)
             self.deck_initialized = True
             self.deal_allowed = True
             self.save()
@@ -902,27 +887,39 @@ class Game(models.Model):
                 raise GameException('Trying to deal during game state: {}'.format(self.current_state()))
             
             # TODO: check if the dealing starts at the correct person
-            cards = self.deck.all().order_by('-isindeck__ordinal')
+            cards = self.deck_cards()[::-1]
             if len(cards) != self.DECK_SIZE:
                 raise GameException('Trying to deal with less than {} cards in the deck'.format(self.DECK_SIZE))
             
-            # Reset all cards in the players' hands
-            CardInHand.objects.filter(isplaying__game=self).delete()
-                
-            # Deal cards
+            # Deal cards, replacing the hands of the players
+            isplayings = self.seating().isplayings
+            for isplaying in isplayings:
+                isplaying.hand = cardset.EMPTY
             next_card_to_deal = 0
-            cards_to_deal = []
             for deal_amount in self.DEAL_ORDER:
-                for isplaying in self.isplaying_set.all():
-                    for card in cards[next_card_to_deal:next_card_to_deal+deal_amount]:
-                        cards_to_deal.append(CardInHand(isplaying=isplaying, card=card))
-                        next_card_to_deal += 1
-                        
-            CardInHand.objects.bulk_create(cards_to_deal)
-                
-            self.deck.clear()
+                for isplaying in isplayings:
+                    isplaying.hand |= cardset.from_cards(cards[next_card_to_deal:next_card_to_deal+deal_amount])
+                    next_card_to_deal += deal_amount
+            for isplaying in isplayings:
+                IsPlaying.objects.filter(id=isplaying.id).update(hand=isplaying.hand)
+            
+            self.set_deck([])
+            super(Game, self).save(update_fields=['deck'])
             
             self.changed()
+            
+            return cards
+    
+    def deck_cards(self):
+        """
+        Returns the engine indices of the cards in the deck, starting with the
+        bottom card
+        
+        """
+        return list(bytearray(self.deck))
+    
+    def set_deck(self, cards):
+        self.deck = bytes(bytearray(cards))
     
     def start_round(self):
         """
@@ -936,7 +933,9 @@ class Game(models.Model):
             if self.current_state() is not self.BEFORE_ROUND:
                 raise GameException('Trying to start round during game state: {}'.format(self.current_state()))
             
-            new_round = Round(game=self, dealer=self.next_dealer())
+            dealer = self.next_dealer()
+            new_round = Round(game=self, dealer=dealer, phase=Round.BIDDING_PHASE, collected_tricks=0, team_tricks=0,
+                              next_bidder=engine.next_seat(self.seat_of(dealer.id)))
             new_round.save()
             
             # Save score for each player at the start of this round
@@ -945,9 +944,10 @@ class Game(models.Model):
                 start_of_round_scores.append(Score(round=new_round, player=isplaying.player, score=isplaying.score))
             Score.objects.bulk_create(start_of_round_scores)
             
-            self.deal()
+            deck = self.deal()
             self.current_round = new_round
             self.save()
+            self.record(events.DEAL, data=deck)
             
             self.advance()
         
@@ -965,37 +965,97 @@ class Game(models.Model):
             if self.current_state() is not self.AFTER_ROUND:
                 raise GameException('Trying to finish round during game state: {}'.format(self.current_state()))
             
-            # Give points to each player
-            for isplaying in self.isplaying_set.all():
-                isplaying.score = isplaying.score + self.current_round.get_points_earned(isplaying.player)
-                isplaying.save()
+            state = self.current_round.state()
+            
+            with transaction.atomic():
+                # Give points to each player, one update for every amount of points earned
+                points = engine.round_points(state)
+                isplayings = list(self.isplaying_set.all())
+                for earned in set(points):
+                    seats = [seat for seat in range(engine.PLAYERS) if points[seat] == earned]
+                    IsPlaying.objects.filter(game=self, seat__in=seats).update(score=models.F('score') + earned)
+                for isplaying in isplayings:
+                    isplaying.score += points[isplaying.seat]
                 
-            # Put all cards in deck in order
-            # TODO: fix if not all tricks were played out
-            ordinal = 0
-            for trick in self.current_round.tricks.all().order_by('-number'):
-                for card in trick.cards.all().order_by('-playedintrick__ordinal'):
-                    IsInDeck(card=card, game=self, ordinal=ordinal).save()
-                    ordinal += 1
-            if not self.current_round.all_tricks_played():
-                for isplaying in self.isplaying_set.all():
-                    for card in isplaying.cards.all():
-                        IsInDeck(card=card, game=self, ordinal=ordinal).save()
-                        ordinal += 1
-                    isplaying.cards.clear()
-                        
+                # Put all cards back in the deck in order
+                if not self.current_round.all_tricks_played():
+                    IsPlaying.objects.filter(game=self).update(hand=cardset.EMPTY)
+                    for isplaying in isplayings:
+                        isplaying.hand = cardset.EMPTY
+                self.set_deck(engine.returned_cards(state))
+                self.current_round = None
+                self.save()
+        
+    
+    def record(self, kind, seat=None, data=None):
+        """
+        Append an event to the log of this game. The first event and every
+        events.SNAPSHOT_INTERVAL'th event also store a snapshot of the state
+        after the event.
+        
+        """
+        with self.game_lock:
+            # The game lock only covers this process, the database hands out the sequence numbers. A stale
+            # event_sequence claims nothing and is read again.
+            while not Game.objects.filter(id=self.id, event_sequence=self.event_sequence).update(event_sequence=models.F('event_sequence') + 1):
+                self.event_sequence = Game.objects.filter(id=self.id).values_list('event_sequence', flat=True).get()
+            self.event_sequence += 1
+            sequence = self.event_sequence
+            GameEvent.objects.create(game=self, sequence=sequence, kind=kind, seat=seat, data=events.encode_data(data))
             
-            self.current_round = None
-            self.save()
+            if sequence == 1:
+                # The log starts here, everything that happened before is only known by the rows
+                snapshot = self.load_state_from_rows()
+            elif sequence % events.SNAPSHOT_INTERVAL == 0:
+                snapshot = self.load_state()
+            else:
+                return
+            GameSnapshot.objects.create(game=self, sequence=sequence, data=events.encode_state(snapshot))
+    
+    def load_state(self, sequence=None):
+        """
+        Rebuild the engine state of this game after the event with the given
+        sequence number (the last event by default) from the latest snapshot
+        and the events after it. Returns None if this game has no event log.
+        
+        """
+        snapshots = self.snapshots.order_by('-sequence')
+        tail = self.events.order_by('sequence')
+        if sequence is not None:
+            snapshots = snapshots.filter(sequence__lte=sequence)
+            tail = tail.filter(sequence__lte=sequence)
+        
+        snapshot = snapshots.first()
+        if snapshot is None:
+            return None
         
+        tail = tail.filter(sequence__gt=snapshot.sequence).values_list('kind', 'seat', 'data')
+        return events.replay(events.decode_state(snapshot.data), 
+                             ((kind, seat, events.decode_data(data)) for kind, seat, data in tail))
+    
+    def load_state_from_rows(self):
+        state = engine.GameState([isplaying.score for isplaying in self.isplaying_set.all()], self.round_number)
+        state.abandoned = [isplaying.seat for isplaying in self.isplaying_set.all() if isplaying.abandoned]
+        if self.current_round is not None:
+            state.round = self.current_round.state()
+        return state
     
     def changed(self):
         """
         If any actions are taken in this game, notify the participants so
-        they can update their game screen
+        they can update their game screen. Within game_changes.collect() this
+        happens once, when the block ends.
     
         """
-        IsPlaying.objects.filter(game=self).update(needs_update=True)
+        game_changes.changed(self)
+    
+    def raise_version(self):
+        Game.objects.filter(id=self.id).update(version=models.F('version') + 1)
+        self.version += 1
+    
+    def announce(self):
+        game_updates.notify(self.id)
+        game_push.publish(self.id, self.version)
     
     def advance(self):
         """
@@ -1009,8 +1069,12 @@ class Game(models.Model):
     def save(self, *args, **kwargs):
         with self.game_lock:
             self.round_number = self.rounds.count()
-            self.changed()
+            if self.pk is not None and 'update_fields' not in kwargs:
+                # The version is only raised by changed() and the event sequence by record(), never overwritten
+                kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                           if not field.primary_key and field.name not in ('version', 'event_sequence')]
             super(Game, self).save(*args, **kwargs)
+            self.changed()
         
 
 class IsPlaying(models.Model):
@@ -1028,47 +1092,55 @@ class IsPlaying(models.Model):
     
     score = models.IntegerField(default=100)
     
-    cards = models.ManyToManyField(Card, through='CardInHand')
-    
-    needs_update = models.BooleanField(default=False)
+    # The cards in the hand of this player as a card set (see game.cardset)
+    hand = models.BigIntegerField(default=cardset.EMPTY)
     
     def __unicode__(self):
         return '%s is playing in Game #%s' % (self.player.username, self.game.id)
     
+    def cards(self):
+        """
+        Returns the cards in the hand of this player, ordered by suit and number
+        
+        """
+        return Card.objects.in_set(self.hand)
+    
     def abandon(self):
         self.abandoned = True
         self.save()
+        self.game.record(events.ABANDON, self.seat)
         self.game.changed()
     
-    def last_bid(self):
-        for bid in self.game.current_round.all_bids():
-            if bid.player == self.player:
-                return bid
-        return None
+class GameEvent(models.Model):
+    """
+    An action taken in a game, see game.events
     
-    def current_tricks(self):
-        if self.game.current_round is not None:
-            tricks = self.game.current_round.tricks.all()
-            count = 0
-            for trick in tricks:
-                if trick.winner() == self.player:
-                    count += 1
-            return count
-        return None
+    """
+    class Meta:
+        ordering = ('sequence', )
+        unique_together = (('game', 'sequence'), )
     
-class CardInHand(models.Model):
+    game = models.ForeignKey(Game, related_name='events')
+    sequence = models.PositiveIntegerField()
     
-    isplaying = models.ForeignKey(IsPlaying)
-    card = models.ForeignKey(Card)
-            
-class IsInDeck(models.Model):
+    kind = models.PositiveSmallIntegerField(choices=events.KINDS)
+    seat = models.PositiveSmallIntegerField(null=True, blank=True)
+    data = models.TextField(blank=True)
     
-    card = models.ForeignKey(Card)
-    game = models.ForeignKey(Game)
+    def __unicode__(self):
+        return '%s #%s of %s' % (self.get_kind_display(), self.sequence, self.game)
     
-    # The place that this card has in the deck (0 is the bottom card)
-    ordinal = models.PositiveSmallIntegerField()
+class GameSnapshot(models.Model):
+    """
+    The encoded engine state of a game after the event with the same sequence
+    number
     
+    """
+    class Meta:
+        ordering = ('sequence', )
+        unique_together = (('game', 'sequence'), )
     
+    game = models.ForeignKey(Game, related_name='snapshots')
+    sequence = models.PositiveIntegerField()
     
-
+    data = models.TextField()
@@ -0,0 +1,41 @@
+"""
+Publishing game changes to the push gateway.
+
+Every change to a game is sent as a single datagram "<game id> <version>" to
+the Unix socket set in settings.GAME_PUSH_SOCKET, where the gateway process
+(see pushgateway.py) passes it on to the browsers that follow the game.
+Publishing never blocks and never fails an action: when the gateway is not
+running the datagram is simply dropped, and the game pages fall back to
+polling when their event stream is closed for good.
+
+"""
+import socket
+import threading
+
+from django.conf import settings
+
+
+class Publisher(object):
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _socket(self):
+        sock = getattr(self._local, 'socket', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            self._local.socket = sock
+        return sock
+
+    def publish(self, game_id, version):
+        path = getattr(settings, 'GAME_PUSH_SOCKET', None)
+        if not path:
+            return
+        try:
+            self._socket().sendto(('%d %d' % (game_id, version)).encode('ascii'), path)
+        except socket.error:
+            pass
+
+
+game_push = Publisher()
@@ -0,0 +1,60 @@
+"""
+Who sits where at the table of a game.
+
+The seating of a game is built once from its IsPlaying rows and then answers
+every seat question without going through the rows again: the player at a
+seat, the seat of a player, the players in turn order and the position of a
+seat as seen by one of the players.
+
+"""
+from game import engine
+
+
+class Seating(object):
+    __slots__ = ('isplayings', 'seats')
+
+    def __init__(self, isplayings):
+        by_seat = [None] * engine.PLAYERS
+        for isplaying in isplayings:
+            by_seat[isplaying.seat] = isplaying
+        # The IsPlaying at every seat, its player is only fetched when asked for
+        self.isplayings = tuple(by_seat)
+        # The seat of every player, by id
+        self.seats = dict((isplaying.player_id, isplaying.seat) for isplaying in isplayings)
+
+    def __contains__(self, player_id):
+        return player_id in self.seats
+
+    def __len__(self):
+        return len(self.seats)
+
+    def seat_of(self, player_id):
+        """
+        Returns the seat of the player with the given id, raises a KeyError if
+        he is not playing
+
+        """
+        return self.seats[player_id]
+
+    def player_at(self, seat):
+        isplaying = self.isplayings[seat]
+        return isplaying.player if isplaying is not None else None
+
+    def isplaying_at(self, seat):
+        return self.isplayings[seat]
+
+    def in_turn_order(self, start):
+        """
+        Returns the players in the order they take turns, starting with the
+        player at the given seat
+
+        """
+        return tuple(self.player_at(seat) for seat in engine.turn_order(start))
+
+    def relative_seat(self, viewer_id, seat):
+        """
+        Returns the position of the given seat as seen by the player with the
+        given id: 0 for his own seat, 1 for the next player and so on
+
+        """
+        return engine.relative_seat(self.seats[viewer_id], seat)
@@ -1,5 +1,79 @@
+// Parts of the game state that can be patched into the page, any other change reloads it
+var PATCHABLE = ['players', 'trick', 'turn'];
+
+function relative_seat(seat) {
+	return (seat - game_seat + 4) % 4;
+}
+
+function card_image(identifier) {
+	return card_image_prefix + identifier + '.png';
+}
+
 function update_game(update) {
-	location.reload();
+	$.ajax({
+		url: game_state_url,
+		type: "GET",
+		data: { since: state_version },
+		
+	}).success(function(state) {
+		var changes = state.changes;
+		
+		if (state.full) {
+			location.reload();
+			return;
+		}
+		for (var key in changes) {
+			if ($.inArray(key, PATCHABLE) < 0) {
+				location.reload();
+				return;
+			}
+		}
+		if (changes.trick !== undefined && $("#current-trick-display").length == 0) {
+			location.reload();
+			return;
+		}
+		
+		state_version = state.version;
+		
+		if (changes.players !== undefined) {
+			$.each(changes.players, function(i, player) {
+				var panel = $("#player-" + relative_seat(player.seat));
+				panel.find(".score").text("Score: " + player.score);
+				if (player.tricks !== null) {
+					panel.find(".player-tricks").text("Tricks won: " + player.tricks);
+				}
+				if (player.cards !== null && player.seat != game_seat) {
+					panel.find(".card-back").slice(player.cards).remove();
+				}
+			});
+		}
+		
+		if (changes.trick !== undefined) {
+			var display = $("#current-trick-display").empty();
+			$.each(changes.trick || [], function(i, play) {
+				$("<img />").attr("src", card_image(play[1]))
+					.attr("id", "trick-card-" + (relative_seat(play[0]) + 1))
+					.appendTo(display);
+			});
+		}
+		
+		if (changes.turn !== undefined) {
+			$(".player .glyphicon-time").remove();
+			if (changes.turn !== null && changes.turn != game_seat) {
+				var panel = $("#player-" + relative_seat(changes.turn));
+				$('<span class="glyphicon glyphicon-time" title="It\'s this player\'s turn."></span>')
+					.insertBefore(panel.find(".panel-title .score"));
+				$.each(state_players, function(i, player) {
+					if (player.seat == changes.turn) {
+						$("#waiting-for").text(player.username);
+					}
+				});
+			}
+		}
+		
+	}).fail(function() {
+		location.reload();
+	});
 }
 
 $(function() {
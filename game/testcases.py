@@ -0,0 +1,149 @@
+"""
+Test cases shared by the tests of the apps that play a game.
+
+"""
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from game import engine
+from game.models import Game, Bid, Card
+
+
+DECK_SEED = 1989
+
+
+def shuffle_deck(game, seed=DECK_SEED):
+    """
+    Replace the randomly ordered deck of the given game by one shuffled with
+    the given seed, so every test plays the same cards
+
+    """
+    cards = list(Card.objects.order_by('id'))
+    random.Random(seed).shuffle(cards)
+    game.set_deck([card.index() for card in cards])
+    game.save()
+
+
+@override_settings(BOT_SYNCHRONOUS=True, BOT_STRATEGY='simple')
+class GameTestCase(TestCase):
+    """
+    A game of a logged in player against 3 bots that play the simple
+    strategy synchronously, dealt from a seeded deck, with helpers that bring
+    the game to a phase
+
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('player', password='secret')
+        self.client.login(username='player', password='secret')
+
+        self.game = Game.objects.start_game([self.user])
+        self.game.initialize_deck()
+        shuffle_deck(self.game)
+
+    def fetch_game(self):
+        return Game.objects.infofetch(self.game.id)
+
+    def start_round(self):
+        self.fetch_game().start_round()
+
+    def bid_until_finalize(self):
+        """
+        Start a round and bid a rik, which the bots leave to the player
+
+        """
+        self.start_round()
+        self.fetch_game().current_round.place_bid(self.user, Bid.RIK)
+
+    def play_until_trick_taking(self):
+        self.bid_until_finalize()
+        round = self.fetch_game().current_round
+        for mate_suit in (Card.DIAMONDS, Card.HEARTS, Card.SPADES):
+            try:
+                round.finalize_bid(self.user, Card.CLUBS, mate_suit)
+                return
+            except Bid.IllegalChoiceException:
+                pass
+
+    def playable_card(self, trick):
+        return trick.round.legal_plays(self.user)[0]
+
+    def play_until_trick_won(self):
+        """
+        Play the first allowed card until the player wins a trick
+
+        """
+        self.play_until_trick_taking()
+        for _ in range(13):
+            trick = self.fetch_game().current_round.current_trick()
+            if trick.is_done():
+                if trick.winner() == self.user:
+                    return trick
+                self.fail('The bots did not collect their trick')
+            trick.play_card(self.user, self.playable_card(trick))
+        self.fail('The player did not win a trick')
+
+    def play_round_through(self):
+        """
+        Play the first allowed card until the round is over
+
+        """
+        self.play_until_trick_taking()
+        for _ in range(2 * engine.TRICKS_PER_ROUND):
+            round = self.fetch_game().current_round
+            if not round.underway():
+                return
+            trick = round.current_trick()
+            if trick.is_done():
+                # The bots collect their own tricks
+                trick.collect(self.user)
+            else:
+                trick.play_card(self.user, self.playable_card(trick))
+        self.fail('The round did not end')
+
+    def state_from_rows(self, game):
+        """
+        Returns the engine state of the given game as the rows tell it,
+        without the event log
+
+        """
+        game_state = game.load_state_from_rows()
+        game_state.round = game.current_round.load_state_from_rows()
+        return game_state
+
+    def game_url(self, view, *args):
+        return '/game/%s/%s/' % (view, '/'.join(str(arg) for arg in (self.game.id,) + args))
+
+
+class ViewBudgetTestCase(GameTestCase):
+    """
+    Requests a view through the test client and fails when it runs more SQL
+    queries or takes longer than its budget in `budgets`, a dictionary of
+    view: (maximum amount of queries, maximum amount of milliseconds). The
+    time budgets depend on the machine, settings.VIEW_BUDGET_TIME_SCALE
+    scales them or, set to 0, leaves them out.
+
+    """
+    budgets = {}
+
+    def assertWithinBudget(self, name, method, url, data=None, **extra):
+        max_queries, max_milliseconds = self.budgets[name]
+        with CaptureQueriesContext(connection) as queries:
+            started = time.time()
+            response = getattr(self.client, method)(url, data or {}, **extra)
+            milliseconds = (time.time() - started) * 1000
+
+        self.assertIn(response.status_code, (200, 302))
+        self.assertLessEqual(len(queries), max_queries,
+                             '%s ran %d queries, the budget is %d' % (name, len(queries), max_queries))
+        if settings.VIEW_BUDGET_TIME_SCALE:
+            max_milliseconds *= settings.VIEW_BUDGET_TIME_SCALE
+            self.assertLessEqual(milliseconds, max_milliseconds,
+                                 '%s took %d ms, the budget is %d ms' % (name, milliseconds, max_milliseconds))
+        return response
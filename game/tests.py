@@ -0,0 +1,478 @@
+"""
+Tests of the game engine, the models and the game views.
+
+The view budget tests build a game in the phase a view is used in, request
+the view through the test client and fail when it runs more SQL queries or
+takes longer than its budget in BUDGETS. When a change legitimately needs
+more queries, raise the budget in the same commit so the increase is
+reviewed.
+
+"""
+import copy
+import json
+import random
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.test import TestCase
+
+from game import engine, cardset, events
+from game.changes import game_changes, unit_of_work
+from game.models import Game, Round, Trick, Bid, Card, IsPlaying
+from game.testcases import GameTestCase, ViewBudgetTestCase, DECK_SEED
+import bot
+from bot import register_strategy
+from bot.strategy import Strategy
+
+# view: (maximum amount of queries, maximum amount of milliseconds). The bots
+# take their turns synchronously here, so the action views include the queries
+# of the bot turns that follow the action. Every action and bot turn runs in a
+# transaction, which the test transaction turns into a savepoint and a release.
+# The bot turns only start once the action before them is committed.
+# The bots play the simple strategy, the budgets are not meant for their thinking.
+# Every query budget is the amount of queries the view runs plus a margin of 2.
+BUDGETS = {
+    'game_before_round': (10, 250),
+    'game_bidding': (21, 250),
+    'game_finalize_bidding': (20, 250),
+    'game_trick_taking': (26, 250),
+    'game_trick_done': (26, 250),
+    'start_round': (79, 500),
+    'place_bid': (26, 500),
+    'pick_trump_and_mate': (86, 500),
+    'play_card': (105, 500),
+    'collect_trick': (31, 500),
+    'wait_for_update': (5, 100),
+    'game_state': (12, 250),
+}
+
+
+class GameViewBudgetTest(ViewBudgetTestCase):
+
+    budgets = BUDGETS
+
+    def test_before_round(self):
+        self.assertWithinBudget('game_before_round', 'get', '/game/%d/' % self.game.id)
+
+    def test_bidding(self):
+        self.start_round()
+        self.assertEqual(self.fetch_game().current_round.current_phase(), Round.BIDDING_PHASE)
+        self.assertWithinBudget('game_bidding', 'get', '/game/%d/' % self.game.id)
+
+    def test_finalize_bidding(self):
+        self.bid_until_finalize()
+        self.assertEqual(self.fetch_game().current_round.current_phase(), Round.FINALIZE_BIDDING_PHASE)
+        self.assertWithinBudget('game_finalize_bidding', 'get', '/game/%d/' % self.game.id)
+
+    def test_trick_taking(self):
+        self.play_until_trick_taking()
+        self.assertEqual(self.fetch_game().current_round.current_phase(), Round.TRICK_TAKING_PHASE)
+        self.assertWithinBudget('game_trick_taking', 'get', '/game/%d/' % self.game.id)
+
+    def test_trick_done(self):
+        self.play_until_trick_won()
+        self.assertWithinBudget('game_trick_done', 'get', '/game/%d/' % self.game.id)
+
+
+class ActionViewBudgetTest(ViewBudgetTestCase):
+
+    budgets = BUDGETS
+
+    def test_start_round(self):
+        self.assertWithinBudget('start_round', 'get', self.game_url('startround'))
+        self.assertEqual(self.fetch_game().current_state(), Game.DURING_ROUND)
+
+    def test_place_bid(self):
+        self.start_round()
+        self.assertWithinBudget('place_bid', 'post', self.game_url('placebid'), {'bid': Bid.RIK})
+        self.assertEqual(self.fetch_game().current_round.current_phase(), Round.FINALIZE_BIDDING_PHASE)
+
+    def test_pick_trump_and_mate(self):
+        self.bid_until_finalize()
+        self.assertWithinBudget('pick_trump_and_mate', 'post', self.game_url('picktrumpandmate'),
+                                {'trump_suit': Card.CLUBS, 'mate_suit': Card.HEARTS})
+
+    def test_play_card(self):
+        self.play_until_trick_taking()
+        trick = self.fetch_game().current_round.current_trick()
+        card = self.playable_card(trick)
+        self.assertWithinBudget('play_card', 'get', self.game_url('playcard', card.identifier()))
+        self.assertFalse(card in self.game.isplaying_set.get(player=self.user).cards())
+
+    def test_collect_trick(self):
+        trick = self.play_until_trick_won()
+        self.assertWithinBudget('collect_trick', 'get', self.game_url('collecttrick'))
+        self.assertTrue(Trick.objects.get(id=trick.id).collected)
+
+
+class UpdateViewBudgetTest(ViewBudgetTestCase):
+
+    budgets = BUDGETS
+
+    def test_wait_for_update(self):
+        response = self.assertWithinBudget('wait_for_update', 'get', self.game_url('update'), {'version': 0},
+                                           HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTrue(json.loads(response.content)['update'])
+
+    def test_game_state(self):
+        self.play_until_trick_taking()
+        response = self.assertWithinBudget('game_state', 'get', self.game_url('state'))
+        self.assertTrue(json.loads(response.content)['full'])
+
+
+class ChangesTest(GameTestCase):
+
+    def test_failed_action_publishes_nothing(self):
+        game = self.fetch_game()
+        version = game.version
+        called = []
+        with self.assertRaises(ValueError):
+            with unit_of_work(game.id):
+                game.changed()
+                game_changes.after(lambda: called.append(True))
+                raise ValueError('The action failed')
+
+        self.assertEqual(self.fetch_game().version, version)
+        self.assertEqual(called, [])
+        self.assertFalse(game_changes.pending)
+
+    def test_one_version_per_action(self):
+        self.play_until_trick_taking()
+        version = self.fetch_game().version
+        card = self.playable_card(self.fetch_game().current_round.current_trick())
+
+        # Every bot turn is an action of its own, keep them out of this one
+        scheduled = []
+        schedule, bot.scheduler.schedule = bot.scheduler.schedule, scheduled.append
+        try:
+            self.client.get(self.game_url('playcard', card.identifier()))
+        finally:
+            bot.scheduler.schedule = schedule
+        self.assertEqual(self.fetch_game().version, version + 1)
+        self.assertEqual(scheduled, [self.game.id])
+
+
+class RaisingStrategy(Strategy):
+    """
+    A bot that always places the lowest bid above the highest bid
+
+    """
+    def choose_bid(self, round_state, seat):
+        bids = [bid for bid in engine.legal_bids(round_state, seat) if bid != engine.PASS]
+        return bids[0] if bids else engine.PASS
+
+
+class TableDisplayTest(GameTestCase):
+
+    def test_current_bid_after_a_raise(self):
+        register_strategy('raising', RaisingStrategy())
+        with self.settings(BOT_STRATEGIES={'Bot #1': 'raising'}):
+            # Bot #1 bids a rik and the other bots pass, so the bidding goes back and forth between the player and Bot #1
+            self.start_round()
+            self.fetch_game().current_round.place_bid(self.user, Bid.RIKp1)
+            self.fetch_game().current_round.place_bid(self.user, Bid.RIKp2)
+        self.assertEqual(self.fetch_game().current_round.next_player_to_bid(), self.user)
+
+        response = self.client.get('/game/%d/' % self.game.id)
+        self.assertContains(response, 'Current Bid: Rik voor 10 by player')
+        self.assertNotContains(response, 'Rik voor 9 by player')
+
+    def test_end_of_round(self):
+        self.play_round_through()
+        game = self.fetch_game()
+        state = game.current_round.state()
+
+        response = self.client.get('/game/%d/' % self.game.id)
+        display = response.context['display']
+        self.assertEqual(display['result']['tricks'], engine.asking_team_tricks(state))
+        self.assertEqual(display['result']['points'], engine.asking_team_points(state))
+        self.assertEqual(display['result']['other_points'], engine.other_player_points(state))
+        self.assertEqual(display['score_history'], [[isplaying.score for isplaying in game.isplaying_set.all()]])
+        self.assertContains(response, 'Round #1 is finished')
+
+
+class FinalizeBidTest(GameTestCase):
+
+    def test_bots_lead_the_first_trick(self):
+        self.play_until_trick_taking()
+        trick = self.fetch_game().current_round.current_trick()
+        # The bots before the player in the first trick play right after the bid is finalized
+        self.assertNotEqual(trick.state().leader, self.fetch_game().seat_of(self.user.id))
+        self.assertEqual(trick.next_player_to_play(), self.user)
+
+
+class EventLogTest(GameTestCase):
+
+    def test_replay_a_round(self):
+        self.play_round_through()
+        game = self.fetch_game()
+        self.assertEqual(list(game.snapshots.values_list('sequence', flat=True)), [1, 32, 64])
+        self.assertEqual(events.encode_state(game.load_state()), events.encode_state(self.state_from_rows(game)))
+
+        # Replaying the log from the first snapshot agrees with every later state, also past the later snapshots
+        first = game.snapshots.get(sequence=1)
+        log = [(kind, seat, events.decode_data(data)) for kind, seat, data in game.events.values_list('kind', 'seat', 'data')]
+        for sequence in range(1, len(log) + 1):
+            replayed = events.replay(events.decode_state(first.data), log[1:sequence])
+            self.assertEqual(events.encode_state(game.load_state(sequence)), events.encode_state(replayed))
+
+    def test_actions_recorded_back_to_back(self):
+        self.start_round()
+        # The second instance does not know about the event the first one records
+        first, second = self.fetch_game(), self.fetch_game()
+        with unit_of_work(first.id):
+            first.record(events.ABANDON, 1)
+            second.record(events.ABANDON, 2)
+
+        game = self.fetch_game()
+        sequences = list(game.events.values_list('sequence', flat=True))
+        self.assertEqual(sequences, list(range(1, len(sequences) + 1)))
+        self.assertEqual(game.event_sequence, len(sequences))
+        self.assertEqual(game.load_state().abandoned, [1, 2])
+
+
+class FinishRoundTest(GameTestCase):
+
+    def test_finish_round(self):
+        self.play_round_through()
+        game = self.fetch_game()
+        game_state = self.state_from_rows(game)
+        returned = engine.returned_cards(game_state.round)
+        before = list(game_state.scores)
+        points = engine.settle_round(game_state)
+
+        game.finish_round()
+        game = self.fetch_game()
+        scores = [isplaying.score for isplaying in game.isplaying_set.order_by('seat')]
+        self.assertEqual(scores, game_state.scores)
+        self.assertEqual([score - start for score, start in zip(scores, before)], points)
+        self.assertEqual(sum(points), 0)
+
+        # The cards go back on the deck in the order they were played and the next round is dealt from it
+        self.assertEqual(game.deck_cards(), returned)
+        self.assertEqual(sorted(returned), list(range(engine.DECK_SIZE)))
+        game.start_round()
+        deal = self.fetch_game().events.filter(kind=events.DEAL).last()
+        self.assertEqual(events.decode_data(deal.data), returned[::-1])
+
+
+class PackedHandsMigrationTest(GameTestCase):
+
+    # The migration before the hands and decks were packed
+    before = ('game', '0005_round_bidding')
+
+    def migrate(self, target=None):
+        """
+        Migrate to the given migration, or the latest ones, and return the
+        models as they are there
+
+        """
+        executor = MigrationExecutor(connection)
+        targets = [target] if target is not None else executor.loader.graph.leaf_nodes()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).render()
+
+    def test_migrate_back_and_forth(self):
+        self.play_until_trick_taking()
+        trick = self.fetch_game().current_round.current_trick()
+        trick.play_card(self.user, self.playable_card(trick))
+        waiting = Game.objects.start_game([self.user])
+        waiting.initialize_deck()
+        hands = dict(IsPlaying.objects.values_list('id', 'hand'))
+        decks = dict((game.id, game.deck_cards()) for game in Game.objects.all())
+        self.assertEqual(len(decks[waiting.id]), engine.DECK_SIZE)
+
+        try:
+            apps = self.migrate(self.before)
+            CardInHand, IsInDeck = apps.get_model('game', 'CardInHand'), apps.get_model('game', 'IsInDeck')
+            for isplaying_id, hand in hands.items():
+                cards = CardInHand.objects.filter(isplaying_id=isplaying_id).values_list('card__suit', 'card__number')
+                self.assertEqual(cardset.from_cards(engine.card(suit, number) for suit, number in cards), hand)
+            for game_id, deck in decks.items():
+                cards = IsInDeck.objects.filter(game_id=game_id).order_by('ordinal').values_list('card__suit', 'card__number')
+                self.assertEqual([engine.card(suit, number) for suit, number in cards], deck)
+        finally:
+            self.migrate()
+
+        self.assertEqual(dict(IsPlaying.objects.values_list('id', 'hand')), hands)
+        self.assertEqual(dict((game.id, game.deck_cards()) for game in Game.objects.all()), decks)
+
+
+class InterruptedStrategy(Strategy):
+    """
+    A bot that notes whether it thinks within a unit of work, and the first
+    time it thinks finds another action came first
+
+    """
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.depths = []
+
+    def choose_bid(self, round_state, seat):
+        self.depths.append(game_changes.depth)
+        if len(self.depths) == 1:
+            Game.objects.filter(id=self.game_id).update(version=F('version') + 1)
+        return super(InterruptedStrategy, self).choose_bid(round_state, seat)
+
+
+class BotTurnTest(GameTestCase):
+
+    def test_bot_thinks_again_when_the_game_changed(self):
+        strategy = InterruptedStrategy(self.game.id)
+        register_strategy('interrupted', strategy)
+        with self.settings(BOT_STRATEGIES={'Bot #1': 'interrupted'}):
+            self.start_round()
+            round = self.fetch_game().current_round
+            if round.next_player_to_bid() == self.user:
+                round.place_bid(self.user, round.legal_bids(self.user)[0])
+
+        # The bot thought outside of the unit of work, twice, and bid once
+        self.assertEqual(strategy.depths, [0, 0])
+        bids = [bid for bid in self.fetch_game().current_round.all_bids() if bid.player.username == 'Bot #1']
+        self.assertEqual(len(bids), 1)
+
+
+class EngineTest(TestCase):
+
+    def cards(self, *cards):
+        return cardset.from_cards(engine.card(suit, number) for suit, number in cards)
+
+    def setUp(self):
+        # The hands only hold the cards the tests need. Seat 0 bids a rik with clubs as trump and asks for
+        # the ace of hearts, which seat 2 holds.
+        self.hands = [
+            self.cards((engine.HEARTS, 2), (engine.HEARTS, 3), (engine.CLUBS, 13)),
+            self.cards((engine.CLUBS, 2), (engine.SPADES, 1)),
+            self.cards((engine.HEARTS, 1), (engine.HEARTS, 10)),
+            self.cards((engine.HEARTS, 13), (engine.DIAMONDS, 5)),
+        ]
+        self.round_state = engine.RoundState(3, list(self.hands))
+        for seat, bid in ((0, engine.RIK), (1, engine.PASS), (2, engine.PASS), (3, engine.PASS)):
+            engine.place_bid(self.round_state, seat, bid)
+        engine.finalize_bid(self.round_state, 0, engine.CLUBS, engine.HEARTS)
+
+    def play(self, *cards):
+        for suit, number in cards:
+            seat = engine.next_to_play(engine.current_trick(self.round_state))
+            engine.play_card(self.round_state, seat, engine.card(suit, number))
+
+    def test_bidding_ends_when_the_others_pass(self):
+        self.assertEqual((self.round_state.bidder, self.round_state.bid), (0, engine.RIK))
+        self.assertEqual(self.round_state.mate_card, engine.card(engine.HEARTS, 1))
+        self.assertEqual(self.round_state.mate, 2)
+
+    def test_last_bidder_can_not_pass_after_all_passes(self):
+        round_state = engine.RoundState(3, list(self.hands))
+        for seat in (0, 1, 2):
+            engine.place_bid(round_state, seat, engine.PASS)
+        self.assertNotIn(engine.PASS, engine.legal_bids(round_state, 3))
+        with self.assertRaises(engine.BadBidException):
+            engine.place_bid(round_state, 3, engine.PASS)
+
+        engine.place_bid(round_state, 3, engine.RIK)
+        self.assertEqual((round_state.bidder, round_state.bid), (3, engine.RIK))
+        self.assertIs(engine.current_phase(round_state), engine.FINALIZE_BIDDING_PHASE)
+
+    def test_following_suit(self):
+        self.play((engine.HEARTS, 2))
+        # Without hearts any card will do
+        self.assertEqual(engine.legal_plays(self.round_state, 1), self.hands[1])
+        self.play((engine.SPADES, 1), (engine.HEARTS, 1))
+
+        self.assertEqual(engine.legal_plays(self.round_state, 3), self.cards((engine.HEARTS, 13)))
+        with self.assertRaises(engine.BadPlayException):
+            engine.play_card(self.round_state, 3, engine.card(engine.DIAMONDS, 5))
+
+    def test_forced_mate_card(self):
+        self.play((engine.HEARTS, 2), (engine.CLUBS, 2))
+        self.assertEqual(engine.legal_plays(self.round_state, 2), self.cards((engine.HEARTS, 1)))
+        with self.assertRaises(engine.BadPlayException):
+            engine.play_card(self.round_state, 2, engine.card(engine.HEARTS, 10))
+
+    def test_trick_winner_with_trump(self):
+        self.play((engine.HEARTS, 2), (engine.CLUBS, 2), (engine.HEARTS, 1), (engine.HEARTS, 13))
+        self.assertEqual(engine.trick_winner(self.round_state, engine.current_trick(self.round_state)), 1)
+
+    def test_trick_winner_without_trump(self):
+        self.play((engine.HEARTS, 2), (engine.SPADES, 1), (engine.HEARTS, 1), (engine.HEARTS, 13))
+        self.assertEqual(engine.trick_winner(self.round_state, engine.current_trick(self.round_state)), 2)
+
+
+class LegalPlaysTest(TestCase):
+
+    def accepted_plays(self, round_state, seat):
+        accepted = cardset.EMPTY
+        for card in range(engine.DECK_SIZE):
+            try:
+                engine.check_play(round_state, seat, card)
+                accepted |= cardset.bit(card)
+            except (engine.GameException, engine.BadPlayException):
+                pass
+        return accepted
+
+    def test_legal_plays_match_check_play(self):
+        rng = random.Random(DECK_SEED)
+        for _ in range(20):
+            deck = list(range(engine.DECK_SIZE))
+            rng.shuffle(deck)
+            round_state = engine.new_round(engine.GameState(), deck)
+            for seat in engine.turn_order(engine.next_seat(round_state.dealer))[:-1]:
+                engine.place_bid(round_state, seat, engine.PASS)
+            engine.place_bid(round_state, round_state.dealer, engine.RIK)
+            for mate_suit in (engine.DIAMONDS, engine.HEARTS, engine.SPADES):
+                try:
+                    engine.finalize_bid(round_state, round_state.dealer, engine.CLUBS, mate_suit)
+                    break
+                except engine.IllegalChoiceException:
+                    pass
+
+            while engine.current_phase(round_state) is engine.TRICK_TAKING_PHASE:
+                trick = engine.current_trick(round_state)
+                if trick.is_done():
+                    engine.collect(round_state, engine.trick_winner(round_state, trick))
+                    continue
+                for seat in range(engine.PLAYERS):
+                    self.assertEqual(engine.legal_plays(round_state, seat), self.accepted_plays(round_state, seat))
+                seat = engine.next_to_play(trick)
+                engine.play_card(round_state, seat, rng.choice(cardset.cards(engine.legal_plays(round_state, seat))))
+
+
+class LegalBidsTest(TestCase):
+
+    def accepted_bids(self, round_state, seat):
+        accepted = []
+        for bid in engine.BIDS:
+            try:
+                engine.check_bid(round_state, seat, bid)
+                accepted.append(bid)
+            except (engine.GameException, engine.BadBidException):
+                pass
+        return accepted
+
+    def test_legal_bids_match_check_bid(self):
+        rng = random.Random(DECK_SEED)
+        for _ in range(20):
+            deck = list(range(engine.DECK_SIZE))
+            rng.shuffle(deck)
+            round_state = engine.new_round(engine.GameState(), deck)
+            while engine.current_phase(round_state) is engine.BIDDING_PHASE:
+                seat = engine.next_bidder(round_state)
+                accepted = self.accepted_bids(round_state, seat)
+                riks = [bid for bid in accepted if engine.is_rik(bid)]
+                expected = [bid for bid in accepted if not engine.is_rik(bid) or bid == min(riks)]
+                self.assertEqual(engine.legal_bids(round_state, seat), expected)
+                engine.place_bid(round_state, seat, rng.choice(expected))
+
+            mate_suits = engine.SUITS if engine.mate_card_needed(round_state.bid) else (None,)
+            for seat in range(engine.PLAYERS):
+                expected = []
+                for trump_suit in engine.SUITS:
+                    for mate_suit in mate_suits:
+                        try:
+                            engine.finalize_bid(copy.deepcopy(round_state), seat, trump_suit, mate_suit)
+                            expected.append((trump_suit, mate_suit))
+                        except (engine.GameException, engine.IllegalChoiceException):
+                            pass
+                finalizations = engine.legal_finalizations(round_state, seat)
+                self.assertEqual([finalization[:2] for finalization in finalizations], expected)
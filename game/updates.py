@@ -0,0 +1,61 @@
+"""
+Waiting for the version of a game to change.
+
+Every change to a game raises its version (see Game.changed). A request that
+waits for a newer version sleeps on a condition that is notified when a game
+changes in this process, and looks at the database again at least every
+POLL_INTERVAL seconds to notice changes made by other processes.
+
+"""
+import threading
+import time
+
+POLL_INTERVAL = 2.0
+
+
+class UpdateBoard(object):
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # For every game that is being waited on: [waiting requests, changes seen in this process]
+        self._waiting = {}
+
+    def notify(self, game_id):
+        with self._condition:
+            entry = self._waiting.get(game_id)
+            if entry is not None:
+                entry[1] += 1
+                self._condition.notify_all()
+
+    def wait(self, game_id, version, timeout, fetch_version):
+        """
+        Block until fetch_version() returns a version newer than the given one
+        or the timeout passes. Returns the last fetched version.
+
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            entry = self._waiting.setdefault(game_id, [0, 0])
+            entry[0] += 1
+
+        try:
+            while True:
+                with self._condition:
+                    seen = entry[1]
+
+                current = fetch_version()
+                remaining = deadline - time.time()
+                if current is None or current > version or remaining <= 0:
+                    return current
+
+                with self._condition:
+                    if entry[1] == seen:
+                        self._condition.wait(min(remaining, POLL_INTERVAL))
+        finally:
+            with self._condition:
+                entry[0] -= 1
+                if entry[0] <= 0:
+                    del self._waiting[game_id]
+
+
+game_updates = UpdateBoard()
@@ -10,5 +10,6 @@ urlpatterns = patterns('',
     url(r'^playcard/(\d+)/(\D\d+)/$', 'game.views.play_card', name='play_card'),
     url(r'^collecttrick/(\d+)/$', 'game.views.collect_trick', name='collect_trick'),
     
-    url(r'^getupdate/$', 'game.views.get_update', name='get_update'),
+    url(r'^update/(\d+)/$', 'game.views.wait_for_update', name='wait_for_update'),
+    url(r'^state/(\d+)/$', 'game.views.game_state', name='game_state'),
 )
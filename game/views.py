@@ -3,10 +3,13 @@ from django.http.response import Http404, HttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from game.models import IsPlaying, Game, Round, Card, Trick, GameException, Bid
 from django.core.exceptions import PermissionDenied
-from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.contrib import messages
 import json
 from game.forms import MakeBidForm, PickTrumpSuitAndMateForm, PickTrumpSuitForm
+from game.updates import game_updates
+from game.api import table_update, table_display
+from game.changes import game_action
 
 @login_required
 def game(request, game_id):
@@ -17,32 +20,37 @@ def game(request, game_id):
     
     game.advance()
     
-    isplaying = get_object_or_404(IsPlaying, game=game, player=request.user)
-    
-    if isplaying.needs_update:
-        isplaying.needs_update = False
-        isplaying.save()
-        
+    if request.user.id not in game.seating():
+        raise Http404()
     
     context = {'game': game}
     
     if game.current_state() is Game.DURING_ROUND and game.current_round.current_phase() is Round.BIDDING_PHASE:
         if game.current_round.next_player_to_bid() == request.user:
-            bid_form = MakeBidForm(current_round=game.current_round)
+            bid_form = MakeBidForm(current_round=game.current_round, player=request.user)
             context['bid_form'] = bid_form
         
     elif game.current_state() is game.DURING_ROUND and game.current_round.current_phase() is Round.FINALIZE_BIDDING_PHASE \
      and game.current_round.highest_bid.player == request.user:
         FinalizeBidForm = game.current_round.highest_bid.get_bidding_finalize_form()
-        context['finalize_bid_form'] = FinalizeBidForm()
+        context['finalize_bid_form'] = FinalizeBidForm(finalizations=game.current_round.legal_finalizations(request.user))
         
     context['g'] = Game
     context['r'] = Round
     context['t'] = Trick
     
+    # Remember what this player sees now, so the next state request only needs the changes
+    context['table'] = table_update(game, request.user)
+    context['display'] = table_display(game, request.user, context['table']['changes'])
+    context['table_players'] = json.dumps([{'seat': player['seat'], 'username': player['username']}
+                                           for player in context['table']['changes']['players']])
+    if settings.GAME_PUSH_URL:
+        context['push_url'] = settings.GAME_PUSH_URL.format(game.id)
+    
     return render(request, 'game/game.html', context)
 
 @login_required
+@game_action
 def abandon_game(request, game_id):
     try:
         isplaying = IsPlaying.objects.get(game__id=game_id, player=request.user, abandoned=False)
@@ -53,6 +61,7 @@ def abandon_game(request, game_id):
     return redirect('portal')
 
 @login_required
+@game_action
 def start_round(request, game_id):
     try:
         game = Game.objects.infofetch(game_id)
@@ -67,6 +76,7 @@ def start_round(request, game_id):
     return redirect('game', game_id)
 
 @login_required
+@game_action
 def place_bid(request, game_id):
     try:
         game = Game.objects.infofetch(game_id)
@@ -91,6 +101,7 @@ def place_bid(request, game_id):
     raise PermissionDenied()
 
 @login_required
+@game_action
 def pick_trump_and_mate(request, game_id):
     if request.method == "POST":
         try:
@@ -119,6 +130,7 @@ def pick_trump_and_mate(request, game_id):
     raise PermissionDenied()
 
 @login_required
+@game_action
 def pick_trump(request, game_id):
     if request.method == "POST":
         try:
@@ -146,13 +158,17 @@ def pick_trump(request, game_id):
     raise PermissionDenied()
     
 @login_required
+@game_action
 def play_card(request, game_id, card_identifier):
     try:
         game = Game.objects.infofetch(game_id)
     except Game.DoesNotExist:
         raise Http404
     
-    card = Card.objects.get_by_identifier(card_identifier)
+    try:
+        card = Card.objects.get_by_identifier(card_identifier)
+    except Card.DoesNotExist:
+        raise Http404
     
     try:
         game.current_round.current_trick().play_card(request.user, card)
@@ -164,6 +180,7 @@ def play_card(request, game_id, card_identifier):
     return redirect('game', game_id)
 
 @login_required
+@game_action
 def collect_trick(request, game_id):
     try:
         game = get_object_or_404(Game, id=game_id)
@@ -176,18 +193,52 @@ def collect_trick(request, game_id):
 
 
 
-@csrf_exempt
-def get_update(request):
-    if request.method != 'POST' or not request.is_ajax():
+@login_required
+def wait_for_update(request, game_id):
+    """
+    Long poll: answers as soon as the version of the game is newer than the
+    version the client has, or when settings.GAME_UPDATE_TIMEOUT passes
+    
+    """
+    if not request.is_ajax():
         raise PermissionDenied()
     
-    isplaying = get_object_or_404(IsPlaying, game__id=request.POST['game'], player__id=request.POST['player'])
-        
-    if isplaying.needs_update:
-        isplaying.needs_update = False
-        isplaying.save()
-        
-        json_data = json.dumps({'update': True})
-        return HttpResponse(json_data, content_type='application/json')
+    try:
+        version = int(request.GET.get('version', 0))
+    except ValueError:
+        raise PermissionDenied()
+    
+    versions = Game.objects.filter(id=game_id, isplaying__player=request.user).values_list('version', flat=True)
+    def fetch_version():
+        try:
+            return versions.all()[0]
+        except IndexError:
+            return None
+    
+    current = game_updates.wait(int(game_id), version, settings.GAME_UPDATE_TIMEOUT, fetch_version)
+    if current is None:
+        raise Http404()
+    
+    return HttpResponse(json.dumps({'update': current > version, 'version': current}), content_type='application/json')
+
+@login_required
+def game_state(request, game_id):
+    """
+    The state of the game as seen by the requesting player, as JSON. If the
+    client passes the version of the state it has, only the changes are sent.
+    
+    """
+    try:
+        game = Game.objects.infofetch(game_id)
+    except Game.DoesNotExist:
+        raise Http404()
+    
+    if request.user.id not in game.seating():
+        raise Http404()
+    
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        since = None
     
-    return HttpResponse(json.dumps({'update': False}), content_type='application/json')
+    return HttpResponse(json.dumps(table_update(game, request.user, since)), content_type='application/json')
@@ -1,18 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from game.models import Game, Card, IsPlaying, IsInDeck, Round, Bid, Trick,\
+from game.models import Game, Card, IsPlaying, Round, Bid, Trick,\
     PlayedInTrick
 
 class IsPlayingInline(admin.TabularInline):
     model = IsPlaying
     max_num = 4
 
-class IsInDeckInline(admin.TabularInline):
-    model = IsInDeck
-
 class GameAdmin(admin.ModelAdmin):
     model = Game
-    inlines = (IsPlayingInline, IsInDeckInline)
+    inlines = (IsPlayingInline, )
 
 class BidInline(admin.TabularInline):
     model = Bid
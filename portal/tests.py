@@ -0,0 +1,28 @@
+"""
+Query and time budget for the portal, see game/testcases.py
+
+"""
+from django.contrib.auth import get_user_model
+
+from game.models import Game
+from game.testcases import ViewBudgetTestCase
+
+# view: (maximum amount of queries, maximum amount of milliseconds), the queries the
+# view runs plus a margin of 2 as in game/tests.py
+BUDGETS = {
+    'portal': (9, 250),
+}
+
+
+class PortalViewBudgetTest(ViewBudgetTestCase):
+
+    budgets = BUDGETS
+
+    def test_portal(self):
+        # An invitation, a pending game and a game that is being played
+        other_user = get_user_model().objects.create_user('other', password='secret')
+        Game.objects.start_game([other_user, self.user])
+        Game.objects.start_game([self.user, other_user])
+        self.start_round()
+
+        self.assertWithinBudget('portal', 'get', '/')
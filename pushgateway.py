@@ -0,0 +1,207 @@
+"""
+Push gateway for the game pages.
+
+A small asyncio server, run next to the Django site with Python 3:
+
+    python3 pushgateway.py --socket /tmp/rikker-push.sock --port 8001
+
+It receives the "<game id> <version>" datagrams the site publishes on every
+change to a game (see game/push.py) and streams them as Server-Sent Events to
+the browsers following /game/<id>/events. The stream only tells a page that
+its game changed, the page then asks the site for the new state as usual, so
+the gateway needs no access to the database or the sessions.
+
+Every connected page only costs an idle coroutine, so one gateway can hold
+the open connections of all players while the Django workers only handle
+their actions. Point settings.GAME_PUSH_SOCKET and settings.GAME_PUSH_URL at
+the gateway to use it.
+
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+
+EVENTS_PATH = re.compile(r'^/game/(\d+)/events/?$')
+
+# Seconds between comments sent on idle streams, so proxies keep them open and dropped clients are noticed
+KEEPALIVE_INTERVAL = 15
+# Seconds a client gets to send its request headers
+HEADER_TIMEOUT = 10
+# Milliseconds a browser waits before reconnecting a dropped stream
+RETRY_DELAY = 3000
+# Seconds the latest version of a game nobody follows is kept, for the pages that are about to follow it
+UNFOLLOWED_SECONDS = 60
+
+
+class Channel(object):
+    """
+    The latest version of every recently published game and the pages
+    following it
+
+    """
+
+    def __init__(self):
+        # The latest version of every game, the least recently published first
+        self.versions = OrderedDict()
+        self.published = {}
+        self.followers = {}
+
+    def publish(self, game_id, version):
+        if version <= self.versions.get(game_id, -1):
+            return
+        now = time.monotonic()
+        self.versions[game_id] = version
+        self.versions.move_to_end(game_id)
+        self.published[game_id] = now
+        for follower in self.followers.get(game_id, ()):
+            follower.set()
+        self.prune(now)
+
+    def prune(self, now):
+        """
+        Forget the versions of the games that nobody follows and that did not
+        change for UNFOLLOWED_SECONDS
+
+        """
+        while self.versions:
+            game_id = next(iter(self.versions))
+            if now - self.published[game_id] < UNFOLLOWED_SECONDS:
+                break
+            if game_id in self.followers:
+                # Still followed, check it again later
+                self.versions.move_to_end(game_id)
+                self.published[game_id] = now
+            else:
+                del self.versions[game_id]
+                del self.published[game_id]
+
+    def follow(self, game_id):
+        follower = asyncio.Event()
+        self.followers.setdefault(game_id, set()).add(follower)
+        return follower
+
+    def unfollow(self, game_id, follower):
+        followers = self.followers.get(game_id)
+        if followers is None:
+            return
+        followers.discard(follower)
+        if not followers:
+            # The version is kept for the followers that reconnect, prune forgets it
+            del self.followers[game_id]
+
+
+class Receiver(asyncio.DatagramProtocol):
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def datagram_received(self, data, addr):
+        try:
+            game_id, version = [int(part) for part in data.split()]
+        except ValueError:
+            return
+        self.channel.publish(game_id, version)
+
+
+def respond(writer, status, headers=()):
+    lines = ['HTTP/1.1 %s' % status] + ['%s: %s' % header for header in headers]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+
+async def read_request(reader):
+    """
+    Returns the request target and headers of an HTTP request
+
+    """
+    request_line = await reader.readline()
+    method, target, protocol = request_line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if method != 'GET':
+        raise ValueError(method)
+    return target, headers
+
+
+async def stream(channel, game_id, version, writer):
+    respond(writer, '200 OK', (
+        ('Content-Type', 'text/event-stream'),
+        ('Cache-Control', 'no-cache'),
+        ('Connection', 'keep-alive'),
+        ('Access-Control-Allow-Origin', '*'),
+        ('X-Accel-Buffering', 'no'),
+    ))
+    writer.write(('retry: %d\n\n' % RETRY_DELAY).encode('ascii'))
+    await writer.drain()
+
+    follower = channel.follow(game_id)
+    try:
+        while True:
+            follower.clear()
+            current = channel.versions.get(game_id)
+            if current is not None and current > version:
+                version = current
+                writer.write(('id: %d\ndata: {"version": %d}\n\n' % (version, version)).encode('ascii'))
+                await writer.drain()
+            try:
+                await asyncio.wait_for(follower.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                writer.write(b': keepalive\n\n')
+                await writer.drain()
+    finally:
+        channel.unfollow(game_id, follower)
+
+
+async def serve(channel, reader, writer):
+    try:
+        target, headers = await asyncio.wait_for(read_request(reader), HEADER_TIMEOUT)
+        url = urlsplit(target)
+        match = EVENTS_PATH.match(url.path)
+        if match is None:
+            respond(writer, '404 Not Found', (('Content-Length', '0'), ('Connection', 'close')))
+            return
+
+        # A reconnecting browser tells us the last version it saw, a new page passes the version it was rendered at
+        version = headers.get('last-event-id') or parse_qs(url.query).get('version', ['-1'])[0]
+        await stream(channel, int(match.group(1)), int(version), writer)
+    except (ValueError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def main(socket_path, host, port):
+    channel = Channel()
+    loop = asyncio.get_running_loop()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(socket_path)
+    await loop.create_datagram_endpoint(lambda: Receiver(channel), sock=sock)
+
+    server = await asyncio.start_server(lambda reader, writer: serve(channel, reader, writer), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream game changes to the game pages as Server-Sent Events.')
+    parser.add_argument('--socket', default='/tmp/rikker-push.sock', help='Unix socket the site publishes game changes to')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    arguments = parser.parse_args()
+
+    try:
+        asyncio.run(main(arguments.socket, arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass